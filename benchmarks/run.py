@@ -0,0 +1,176 @@
+"""Compare the overhead of funbites to plain Python, generators and state machines.
+
+Usage::
+
+    python -m benchmarks.run [-o results.json] [--compare baseline.json]
+
+Each workload in ``benchmarks.workloads`` is run in every form, and the harness
+reports:
+
+* the throughput, in units of work (suspension points) per second, taking the
+  best of several runs
+* the peak memory allocated during a run, measured with tracemalloc
+* for the checkpointable form, the throughput and the number of bytes written per
+  second when a Checkpointer saves a checkpoint at every suspension point
+
+The results are written as JSON, so that they can be compared across commits with
+``--compare``.
+"""
+
+import argparse
+import json
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from funbites.checkpoint import Checkpointer
+
+from .workloads import WORKLOADS
+
+
+def best_time(func, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func, arg):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_checkpointed(func, arg, directory):
+    """Run func with a Checkpointer that saves a checkpoint at every split point.
+
+    Returns:
+        A (seconds, bytes_written) tuple.
+    """
+    sizes = []
+
+    def save(state, file):
+        # Count the bytes written without measure=True, which pickles every
+        # captured variable a second time
+        pickle.dump(state, file)
+        sizes.append(file.tell())
+
+    chk = Checkpointer(
+        Path(directory) / "bench.pkl",
+        save_function=save,
+        load_function=pickle.load,
+        cleanup=True,
+    )
+    start = time.perf_counter()
+    chk.run(func, arg)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(sizes)
+
+
+def run_workload(workload, scale, repeat):
+    arg = workload.make_input(scale)
+    size = workload.size(arg)
+    expected = workload.forms["plain"](arg)
+    results = []
+    for form, func in workload.forms.items():
+        if func(arg) != expected:
+            raise Exception(f"{workload.name}/{form} does not compute the right result")
+        seconds = best_time(func, arg, repeat)
+        results.append(
+            {
+                "workload": workload.name,
+                "form": form,
+                "size": size,
+                "seconds": seconds,
+                "throughput": size / seconds,
+                "peak_memory": peak_memory(func, arg),
+            }
+        )
+    func = workload.forms["checkpointable"]
+    with tempfile.TemporaryDirectory() as directory:
+        seconds, written = run_checkpointed(func, arg, directory)
+    results.append(
+        {
+            "workload": workload.name,
+            "form": "checkpointed",
+            "size": size,
+            "seconds": seconds,
+            "throughput": size / seconds,
+            "checkpoint_bytes_per_sec": written / seconds,
+        }
+    )
+    return results
+
+
+def report(results, baseline=None):
+    """Print a table of the results, compared to the baseline results if given."""
+    previous = {(r["workload"], r["form"]): r for r in (baseline or {}).get("results", [])}
+    plain = {r["workload"]: r["throughput"] for r in results if r["form"] == "plain"}
+    print(
+        f"{'workload':14} {'form':15} {'units/s':>12} {'vs plain':>9}"
+        f" {'peak KiB':>9} {'ckpt MB/s':>9} {'vs base':>8}"
+    )
+    for r in results:
+        slowdown = plain[r["workload"]] / r["throughput"]
+        peak = r.get("peak_memory")
+        written = r.get("checkpoint_bytes_per_sec")
+        base = previous.get((r["workload"], r["form"]), None)
+        change = f"{r['throughput'] / base['throughput'] - 1:+.0%}" if base else ""
+        print(
+            f"{r['workload']:14} {r['form']:15} {r['throughput']:12,.0f}"
+            f" {slowdown:8.1f}x"
+            f" {'' if peak is None else f'{peak / 1024:9.0f}':>9}"
+            f" {'' if written is None else f'{written / 1e6:9.2f}':>9}"
+            f" {change:>8}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Compare the overhead of funbites to other forms of the same code.",
+    )
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare to the results in this JSON file")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply the input sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+    parser.add_argument("-w", "--workload", action="append", help="Only run these workloads")
+    options = parser.parse_args(argv)
+
+    results = []
+    for workload in WORKLOADS:
+        if options.workload and workload.name not in options.workload:
+            continue
+        results.extend(run_workload(workload, options.scale, options.repeat))
+
+    baseline = None
+    if options.compare:
+        baseline = json.loads(Path(options.compare).read_text())
+    report(results, baseline)
+
+    if options.output:
+        data = {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "scale": options.scale,
+            "repeat": options.repeat,
+            "results": results,
+        }
+        Path(options.output).write_text(json.dumps(data, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
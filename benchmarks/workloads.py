@@ -0,0 +1,448 @@
+"""Workloads for the overhead benchmark, each written in several forms.
+
+Every form computes the same result and can be suspended at the same points:
+
+* ``plain``: plain Python, which cannot be suspended
+* ``generator``: a native generator that yields at each suspension point
+* ``state_machine``: a hand-written object whose ``step`` method runs up to the
+  next suspension point
+* ``checkpointable``: a ``@checkpointable`` function that calls ``checkpoint()``
+  at each suspension point
+* ``resumable``: a ``@resumable`` generator that yields at each suspension point
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+from funbites.checkpoint import checkpoint
+from funbites.interface import checkpointable, resumable
+
+
+def drain(gen):
+    """Run a generator to completion and return its return value."""
+    try:
+        while True:
+            next(gen)
+    except StopIteration as stop:
+        return stop.value
+
+
+def run_machine(machine):
+    while not machine.done:
+        machine.step()
+    return machine.result
+
+
+@dataclass
+class Workload:
+    """A benchmark workload.
+
+    Attributes:
+        name: The name of the workload
+        make_input: Create the input of the workload for a given scale
+        size: The number of units of work (suspension points) for an input
+        forms: The implementations of the workload, by form name
+    """
+
+    name: str
+    make_input: Callable
+    size: Callable
+    forms: dict
+
+
+# Numeric loop
+
+
+def numeric_plain(n):
+    total = 0
+    for i in range(n):
+        total = (total + i * i) % 1_000_003
+    return total
+
+
+def numeric_generator(n):
+    total = 0
+    for i in range(n):
+        total = (total + i * i) % 1_000_003
+        yield
+    return total
+
+
+class NumericMachine:
+    def __init__(self, n):
+        self.n = n
+        self.i = 0
+        self.total = 0
+        self.done = n == 0
+        self.result = 0
+
+    def step(self):
+        i = self.i
+        self.total = (self.total + i * i) % 1_000_003
+        self.i = i + 1
+        if self.i >= self.n:
+            self.done = True
+            self.result = self.total
+
+
+@checkpointable
+def numeric_checkpointable(n):
+    total = 0
+    for i in range(n):
+        total = (total + i * i) % 1_000_003
+        checkpoint()
+    return total
+
+
+@resumable
+def numeric_resumable(n):
+    total = 0
+    for i in range(n):
+        total = (total + i * i) % 1_000_003
+        yield
+    return total
+
+
+numeric = Workload(
+    name="numeric",
+    make_input=lambda scale: 20_000 * scale,
+    size=lambda n: n,
+    forms={
+        "plain": numeric_plain,
+        "generator": lambda n: drain(numeric_generator(n)),
+        "state_machine": lambda n: run_machine(NumericMachine(n)),
+        "checkpointable": numeric_checkpointable,
+        "resumable": lambda n: drain(numeric_resumable(n)),
+    },
+)
+
+
+# Nested loops with a break
+
+
+def nested_plain(n):
+    total = 0
+    for i in range(n):
+        for j in range(n):
+            if (i * j) % 7 == 6:
+                break
+            total += i * j
+    return total
+
+
+def nested_generator(n):
+    total = 0
+    for i in range(n):
+        for j in range(n):
+            if (i * j) % 7 == 6:
+                break
+            total += i * j
+            yield
+    return total
+
+
+class NestedMachine:
+    def __init__(self, n):
+        self.n = n
+        self.i = 0
+        self.j = 0
+        self.total = 0
+        self.done = False
+        self.result = None
+        self.advance()
+
+    def advance(self):
+        # Move to the next (i, j) that is not past a break
+        while self.i < self.n:
+            if self.j < self.n and (self.i * self.j) % 7 != 6:
+                return
+            self.i += 1
+            self.j = 0
+        self.done = True
+        self.result = self.total
+
+    def step(self):
+        self.total += self.i * self.j
+        self.j += 1
+        self.advance()
+
+
+@checkpointable
+def nested_checkpointable(n):
+    total = 0
+    for i in range(n):
+        for j in range(n):
+            if (i * j) % 7 == 6:
+                break
+            total += i * j
+            checkpoint()
+    return total
+
+
+@resumable
+def nested_resumable(n):
+    total = 0
+    for i in range(n):
+        for j in range(n):
+            if (i * j) % 7 == 6:
+                break
+            total += i * j
+            yield
+    return total
+
+
+def _nested_size(n):
+    size = 0
+    for i in range(n):
+        for j in range(n):
+            if (i * j) % 7 == 6:
+                break
+            size += 1
+    return size
+
+
+nested = Workload(
+    name="nested_break",
+    make_input=lambda scale: 200 * scale,
+    size=_nested_size,
+    forms={
+        "plain": nested_plain,
+        "generator": lambda n: drain(nested_generator(n)),
+        "state_machine": lambda n: run_machine(NestedMachine(n)),
+        "checkpointable": nested_checkpointable,
+        "resumable": lambda n: drain(nested_resumable(n)),
+    },
+)
+
+
+# Tokenizer
+
+
+WORDS = ["alpha", "beta", "gamma", "x1", "42", "3", "(", ")", "+", "delta_2", "7"]
+
+
+def make_text(scale):
+    return " ".join(WORDS[(i * 7) % len(WORDS)] for i in range(2_000 * scale))
+
+
+def _kind(c):
+    if c.isalpha() or c == "_":
+        return "word"
+    elif c.isdigit():
+        return "number"
+    elif c.isspace():
+        return "space"
+    else:
+        return "punct"
+
+
+def tokenize_plain(text):
+    tokens = []
+    start = 0
+    n = len(text)
+    while start < n:
+        kind = _kind(text[start])
+        end = start + 1
+        if kind == "word":
+            while end < n and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+        elif kind == "number":
+            while end < n and text[end].isdigit():
+                end += 1
+        if kind != "space":
+            tokens.append((kind, text[start:end]))
+        start = end
+    return tokens
+
+
+def tokenize_generator(text):
+    tokens = []
+    start = 0
+    n = len(text)
+    while start < n:
+        kind = _kind(text[start])
+        end = start + 1
+        if kind == "word":
+            while end < n and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+        elif kind == "number":
+            while end < n and text[end].isdigit():
+                end += 1
+        if kind != "space":
+            tokens.append((kind, text[start:end]))
+            yield
+        start = end
+    return tokens
+
+
+class TokenizerMachine:
+    def __init__(self, text):
+        self.text = text
+        self.start = 0
+        self.tokens = []
+        self.done = not text
+        self.result = self.tokens
+
+    def step(self):
+        text = self.text
+        n = len(text)
+        while self.start < n:
+            start = self.start
+            kind = _kind(text[start])
+            end = start + 1
+            if kind == "word":
+                while end < n and (text[end].isalnum() or text[end] == "_"):
+                    end += 1
+            elif kind == "number":
+                while end < n and text[end].isdigit():
+                    end += 1
+            self.start = end
+            if kind != "space":
+                self.tokens.append((kind, text[start:end]))
+                break
+        if self.start >= n:
+            self.done = True
+
+
+@checkpointable
+def tokenize_checkpointable(text):
+    tokens = []
+    start = 0
+    n = len(text)
+    while start < n:
+        kind = _kind(text[start])
+        end = start + 1
+        if kind == "word":
+            while end < n and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+        elif kind == "number":
+            while end < n and text[end].isdigit():
+                end += 1
+        if kind != "space":
+            tokens.append((kind, text[start:end]))
+            checkpoint()
+        start = end
+    return tokens
+
+
+@resumable
+def tokenize_resumable(text):
+    tokens = []
+    start = 0
+    n = len(text)
+    while start < n:
+        kind = _kind(text[start])
+        end = start + 1
+        if kind == "word":
+            while end < n and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+        elif kind == "number":
+            while end < n and text[end].isdigit():
+                end += 1
+        if kind != "space":
+            tokens.append((kind, text[start:end]))
+            yield
+        start = end
+    return tokens
+
+
+tokenizer = Workload(
+    name="tokenizer",
+    make_input=make_text,
+    size=lambda text: len(tokenize_plain(text)),
+    forms={
+        "plain": tokenize_plain,
+        "generator": lambda text: drain(tokenize_generator(text)),
+        "state_machine": lambda text: run_machine(TokenizerMachine(text)),
+        "checkpointable": tokenize_checkpointable,
+        "resumable": lambda text: drain(tokenize_resumable(text)),
+    },
+)
+
+
+# Tree walk
+
+
+def make_tree(depth, value=1):
+    """Make a complete binary tree of (value, left, right) tuples."""
+    if depth == 0:
+        return None
+    return (value, make_tree(depth - 1, 2 * value), make_tree(depth - 1, 2 * value + 1))
+
+
+def tree_plain(node):
+    if node is None:
+        return 0
+    value, left, right = node
+    return value + tree_plain(left) + tree_plain(right)
+
+
+def tree_generator(node):
+    if node is None:
+        return 0
+    value, left, right = node
+    yield
+    total = yield from tree_generator(left)
+    total += yield from tree_generator(right)
+    return value + total
+
+
+class TreeMachine:
+    def __init__(self, node):
+        self.stack = [node] if node is not None else []
+        self.total = 0
+        self.done = not self.stack
+        self.result = 0
+
+    def step(self):
+        value, left, right = self.stack.pop()
+        self.total += value
+        if right is not None:
+            self.stack.append(right)
+        if left is not None:
+            self.stack.append(left)
+        if not self.stack:
+            self.done = True
+            self.result = self.total
+
+
+@checkpointable
+def tree_checkpointable(node):
+    if node is None:
+        return 0
+    value, left, right = node
+    checkpoint()
+    return value + tree_checkpointable(left) + tree_checkpointable(right)
+
+
+@resumable
+def tree_resumable(node):
+    # Recursion in generators needs yield from, so this uses an explicit stack
+    stack = [node] if node is not None else []
+    total = 0
+    while stack:
+        value, left, right = stack.pop()
+        total += value
+        if right is not None:
+            stack.append(right)
+        if left is not None:
+            stack.append(left)
+        yield
+    return total
+
+
+tree = Workload(
+    name="tree_walk",
+    make_input=lambda scale: make_tree(10 + scale.bit_length() - 1),
+    size=lambda node: 0 if node is None else 1 + tree.size(node[1]) + tree.size(node[2]),
+    forms={
+        "plain": tree_plain,
+        "generator": lambda node: drain(tree_generator(node)),
+        "state_machine": lambda node: run_machine(TreeMachine(node)),
+        "checkpointable": tree_checkpointable,
+        "resumable": lambda node: drain(tree_resumable(node)),
+    },
+)
+
+
+WORKLOADS = [numeric, nested, tokenizer, tree]
@@ -0,0 +1,119 @@
+"""Split the functions of a module ahead of time.
+
+Usage::
+
+    python -m funbites.aot [-o OUTDIR] [--compile] MODULE...
+
+For each module, this writes a copy of it in OUTDIR (``build/funbites`` by
+default), under the same package path, in which the continuations of every
+module-level ``@checkpointable`` or ``@resumable`` function are defined right
+before the function. The decorators find them there and do not split the function
+again, so importing the generated module does not transform any code.
+"""
+
+import argparse
+import ast
+import importlib
+import py_compile
+import sys
+from pathlib import Path
+
+from . import cache, interface
+
+HEADER = "# Generated by funbites.aot from {}. Do not edit.\n"
+RUNTIME_IMPORTS = "".join(
+    f"from {value.__module__} import {value.__name__} as {name}\n"
+    for name, value in interface.RUNTIME.items()
+)
+
+
+def record(module):
+    """Import module and record how its functions are split.
+
+    Returns:
+        The imported module and a list of (fn, strategy, tree, source_hash), where
+        tree is None if fn has no split points.
+    """
+    if module in sys.modules:
+        raise Exception(f"{module} is already imported and cannot be split again")
+    recorded = []
+    previous = interface.recording, cache.split_cache
+    interface.recording, cache.split_cache = recorded, None
+    try:
+        mod = importlib.import_module(module)
+    finally:
+        interface.recording, cache.split_cache = previous
+    return mod, recorded
+
+
+def generate(mod, recorded):
+    """Generate the source code of mod with its continuations defined ahead of time.
+
+    Only the functions defined at the top level of the module are split ahead of
+    time. The other ones are split when the module is imported, as usual.
+    """
+    source = Path(mod.__file__).read_text()
+    lines = source.splitlines(keepends=True)
+    defs = {
+        node.name: node
+        for node in ast.parse(source).body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    blocks = []
+    for fn, strategy, tree, source_hash in recorded:
+        node = defs.get(fn.__qualname__, None)
+        if fn.__globals__ is not vars(mod) or node is None:
+            continue
+        names = tuple(defn.name for defn in tree.body) if tree else ()
+        entry = (cache.strategy_key(strategy), names, source_hash)
+        block = [f"__funbites_splits__[{fn.__qualname__!r}] = {entry!r}\n"]
+        if tree:
+            block.append(ast.unparse(tree) + "\n")
+        start = min(d.lineno for d in [node, *node.decorator_list])
+        blocks.append((start, "\n".join(block) + "\n\n"))
+    if not blocks:
+        return None
+    blocks.sort()
+    first = blocks[0][0]
+    blocks[0] = (first, RUNTIME_IMPORTS + "__funbites_splits__ = {}\n" + blocks[0][1])
+    # Insert from the bottom so that the line numbers of the blocks stay valid
+    for start, block in reversed(blocks):
+        lines.insert(start - 1, block)
+    return HEADER.format(Path(mod.__file__).name) + "".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m funbites.aot",
+        description="Split the functions of modules ahead of time.",
+    )
+    parser.add_argument("modules", nargs="+", help="The modules to split")
+    parser.add_argument(
+        "-o", "--outdir", default="build/funbites", help="Where to write the modules"
+    )
+    parser.add_argument(
+        "--compile", action="store_true", help="Also compile the modules to .pyc"
+    )
+    options = parser.parse_args(argv)
+    outdir = Path(options.outdir)
+    for module in options.modules:
+        mod, recorded = record(module)
+        code = generate(mod, recorded)
+        if code is None:
+            print(f"{module}: no functions to split", file=sys.stderr)
+            continue
+        relpath = Path(*module.split("."))
+        if Path(mod.__file__).name == "__init__.py":
+            relpath = relpath / "__init__.py"
+        else:
+            relpath = relpath.with_suffix(".py")
+        path = outdir / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(code)
+        if options.compile:
+            py_compile.compile(str(path), doraise=True)
+        print(f"{module}: wrote {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
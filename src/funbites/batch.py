@@ -0,0 +1,138 @@
+from itertools import islice
+
+from .checkpoint import checkpointer
+from .runtime import FunBite
+from .strategy import Fun, returns
+
+
+class Batch:
+    """Run many independent instances of a split function in lockstep.
+
+    Up to ``window`` instances run at the same time, and the others wait for one
+    of them to finish. Each round advances every running instance by one bite: the
+    bites are grouped by continuation, and each continuation is called over its
+    whole group in a row. Keeping the window small bounds the number of live bites,
+    which keeps the garbage collector from scanning all of them over and over.
+
+    Instances do not save their own checkpoints: when any of them reaches a
+    checkpoint in a round, the state of the whole batch is saved at the end of the
+    round, as a single checkpoint, with the given Checkpointer.
+
+    Args:
+        states: The initial state of each instance, a FunBite or a result
+        checkpointer: The Checkpointer that saves the batch, if any
+        window: The maximum number of instances running at the same time
+    """
+
+    def __init__(self, states, checkpointer=None, window=1000):
+        self.states = list(states)
+        self.checkpointer = checkpointer
+        self.window = window
+        self.requested = False
+        # The (index, bite) pairs of the running instances, grouped by continuation
+        self.groups = {}
+        self.running = 0
+        self.waiting = iter(
+            [i for i, state in enumerate(self.states) if isinstance(state, FunBite)]
+        )
+        self.admit()
+
+    @classmethod
+    def start(cls, func, *iterables, checkpointer=None, window=1000):
+        """Create a batch that calls func on each input, like map(func, *iterables).
+
+        Args:
+            func: A checkpointable function
+            iterables: The arguments of each call
+            checkpointer: The Checkpointer that saves the batch, if any
+            window: The maximum number of instances running at the same time
+        """
+        if not isinstance(func, Fun) or not func.__is_continuator__:
+            raise TypeError("Only checkpointable functions can be run in a batch")
+        entry = func.entry
+        states = [FunBite(entry, *args, continuation=returns) for args in zip(*iterables)]
+        return cls(states, checkpointer, window)
+
+    def admit(self):
+        """Start waiting instances until the window is full."""
+        states = self.states
+        groups = self.groups
+        for i in islice(self.waiting, self.window - self.running):
+            state = states[i]
+            groups.setdefault(state.func, []).append((i, state))
+            self.running += 1
+
+    def state(self):
+        """Return the state of the batch as a FunBite, which runs the rest of it."""
+        states = list(self.states)
+        for group in self.groups.values():
+            for i, state in group:
+                states[i] = state
+        return FunBite(_resume, *states, window=self.window)
+
+    def store(self, state):
+        # The batch stands in for the Checkpointer of its instances, and only
+        # takes note that a checkpoint is due
+        self.requested = True
+
+    def step(self):
+        """Advance every running instance by one bite.
+
+        Returns:
+            Whether all the instances are finished.
+        """
+        states = self.states
+        groups = {}
+        for func, group in self.groups.items():
+            for i, state in group:
+                state = func(*state.args, **state.kwargs)
+                if isinstance(state, FunBite):
+                    if (following := groups.get(state.func, None)) is None:
+                        groups[state.func] = following = []
+                    following.append((i, state))
+                else:
+                    states[i] = state
+                    self.running -= 1
+        self.groups = groups
+        self.admit()
+        return not self.groups
+
+    def run(self):
+        """Run all the instances to completion.
+
+        Returns:
+            The list of the results of the instances, in order.
+        """
+        token = checkpointer.set(self if self.checkpointer is not None else None)
+        try:
+            while self.groups:
+                self.step()
+                if self.requested:
+                    self.requested = False
+                    self.checkpointer.store(self.state())
+        finally:
+            checkpointer.reset(token)
+        return self.states
+
+
+def _resume(*states, window):
+    return Batch(states, checkpointer.get(), window).run()
+
+
+def run_batch(func, *iterables, window=1000):
+    """Call a checkpointable function on many inputs, in a Batch.
+
+    The batch is saved by the active Checkpointer, so that
+    ``Checkpointer(filename).run(run_batch, func, inputs)`` resumes the whole
+    batch from its last checkpoint.
+
+    Args:
+        func: A checkpointable function
+        iterables: The arguments of each call, as in map(func, *iterables)
+        window: The maximum number of instances running at the same time
+
+    Returns:
+        The list of the results.
+    """
+    batch = Batch.start(func, *iterables, checkpointer=checkpointer.get(), window=window)
+    return batch.run()
@@ -0,0 +1,104 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+from pathlib import Path
+from types import CodeType
+
+from .store import write_atomic
+
+
+def _with_filename(code, filename):
+    """Set the filename of code and of all the code objects nested in it."""
+    consts = tuple(
+        _with_filename(c, filename) if isinstance(c, CodeType) else c for c in code.co_consts
+    )
+    return code.replace(co_filename=filename, co_consts=consts)
+
+
+def strategy_key(strategy):
+    """Identify a strategy and the options that change how it splits functions."""
+    return f"{type(strategy).__qualname__}:{strategy.variant}"
+
+
+def fingerprint(fn, strategy):
+    """Identify a function's code and the way it is split.
+
+    The fingerprint does not depend on the file the function is loaded from, so
+    that it is the same when the code is moved, for example into a zipapp.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(importlib.util.MAGIC_NUMBER)
+    h.update(marshal.dumps(_with_filename(fn.__code__, "")))
+    h.update(fn.__qualname__.encode())
+    h.update(strategy_key(strategy).encode())
+    return h.hexdigest()
+
+
+class SplitCache:
+    """On-disk cache of split functions.
+
+    Each entry holds the compiled code of the continuations of a function, keyed by
+    the fingerprint of the function's bytecode, so that splitting a function that
+    is in the cache needs neither its source code nor the cost of parsing and
+    splitting it again. The cache can be populated by importing the code once from
+    its sources, and then shipped along with deployments that have no sources.
+
+    The split of a function may depend on the globals that are defined when it is
+    decorated, for example on whether a function it calls is a continuator. The
+    cache assumes that these are the same as when the entry was created.
+
+    Args:
+        directory: The directory to store the entries in
+        readonly: Do not add new entries to the cache
+    """
+
+    def __init__(self, directory, readonly=False):
+        self.directory = Path(directory)
+        self.readonly = readonly
+
+    def _path(self, key):
+        return self.directory / f"{key}.bin"
+
+    def get(self, fn, strategy):
+        """Return the cached split of fn, or None.
+
+        Returns:
+            A (code, names, source_hash) tuple, where code defines the functions in
+            names, or is None if fn has no split points.
+        """
+        path = self._path(fingerprint(fn, strategy))
+        if not path.exists():
+            return None
+        code, names, source_hash = marshal.loads(path.read_bytes())
+        if code is not None:
+            code = _with_filename(code, fn.__code__.co_filename)
+        return code, names, source_hash
+
+    def put(self, fn, strategy, entry):
+        if self.readonly:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(self._path(fingerprint(fn, strategy)), marshal.dumps(entry))
+
+
+split_cache = None
+
+
+def use_split_cache(directory, readonly=False):
+    """Cache the functions split from now on in directory.
+
+    The cache is also enabled when the process starts if the FUNBITES_SPLIT_CACHE
+    environment variable is set to a directory.
+
+    Args:
+        directory: The directory of the cache, or None to disable caching
+        readonly: Do not add new entries to the cache
+    """
+    global split_cache
+    split_cache = directory and SplitCache(directory, readonly=readonly)
+    return split_cache
+
+
+if os.environ.get("FUNBITES_SPLIT_CACHE"):
+    use_split_cache(os.environ["FUNBITES_SPLIT_CACHE"])
@@ -1,41 +1,244 @@
+import json
+import os
 import pickle
+import threading
+import time
 from contextvars import ContextVar
+from dataclasses import dataclass
+from io import BytesIO
 from pathlib import Path
+from queue import SimpleQueue
 
-from .runtime import FunBite
+from .history import History
+from .registry import MANIFEST_VERSION, describe, manifest, origins, reference
+from .runtime import FunBite, captured, chain
+from .store import ObjectStore, write_atomic
 from .strategy import continuator, returns
 
 checkpointer = ContextVar("checkpointer", default=None)
 
 
+@dataclass
+class SaveRecord:
+    """Size accounting for one checkpoint.
+
+    Attributes:
+        time: When the checkpoint was saved
+        size: The size of the checkpoint file, in bytes
+        variables: The pickled size of each captured variable, keyed by
+            "function.variable"
+    """
+
+    time: float
+    size: int
+    variables: dict
+
+
+def _variable_names(func):
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return ()
+    return code.co_varnames[: code.co_argcount + code.co_kwonlyargcount]
+
+
+def variable_sizes(state):
+    """Compute the pickled size of each variable captured in a FunBite chain.
+
+    Continuations are followed down the chain, so the variables of the callers
+    are accounted for separately from those of the callee.
+
+    Args:
+        state: A FunBite or FunBiteYield
+
+    Returns:
+        A dictionary mapping "function.variable" to a size in bytes.
+    """
+    sizes = {}
+    for func, key, value in captured(state):
+        origin = origins.get(reference(func), None)
+        fname = origin.qualname if origin else getattr(func, "__qualname__", repr(func))
+        if isinstance(key, int):
+            names = _variable_names(func)
+            key = names[key] if key < len(names) else f"#{key}"
+        key = f"{fname}.{key}"
+        sizes[key] = sizes.get(key, 0) + len(pickle.dumps(value))
+    return sizes
+
+
 class Checkpointer:
-    def __init__(self, filename, save_function=None, load_function=None, cleanup=False):
+    def __init__(
+        self,
+        filename,
+        save_function=None,
+        load_function=None,
+        cleanup=False,
+        measure=False,
+        history=None,
+        dedup=False,
+    ):
         self.file = Path(filename)
         if (save_function is None) ^ (load_function is None):
             raise TypeError(
                 "Please provide *both* save_function and load_function, or neither to use the defaults."
             )
+        if dedup and save_function is not None:
+            raise TypeError("dedup cannot be used with custom save and load functions")
         if save_function is None:
             save_function = pickle.dump
             load_function = pickle.load
         self.save = save_function
         self.load = load_function
         self.cleanup = cleanup
+        self.measure = measure
+        self.records = []
+        self.history = history and History(
+            self.file.with_name(f"{self.file.name}.history"), size=history
+        )
+        self.objects = dedup and ObjectStore(self.file.with_name(f"{self.file.name}.objects"))
+        self.manifest_file = self.file.with_name(f"{self.file.name}.manifest")
+        self._keys = []
+        self._described = set()
         self._token = None
 
+    def readonly(self, *objects):
+        """Declare objects that will not be modified while they are checkpointed.
+
+        With dedup, they are only serialized and hashed once.
+        """
+        if self.objects:
+            self.objects.readonly(*objects)
+
+    def exists(self):
+        """Whether there is a checkpoint to resume from."""
+        return self.file.exists()
+
     def run(self, func, *args, **kwargs):
         with self:
-            if self.file.exists():
-                cont = self.load(self.file.open("rb"))
-                rval = cont.execute()
+            if self.exists():
+                rval = self.restore().execute()
             else:
                 rval = func(*args, **kwargs)
+        self.finish(rval)
+        return rval
+
+    def restore(self):
+        token = manifest.set(self._read_manifest())
+        try:
+            with self.file.open("rb") as f:
+                if not self.objects:
+                    return self.load(f)
+                state, keys = self.objects.load(f)
+        finally:
+            manifest.reset(token)
+        self._keep(keys)
+        self.objects.collect()
+        return state
+
+    def _read_manifest(self):
+        if not self.manifest_file.exists():
+            return None
+        data = json.loads(self.manifest_file.read_text())
+        if data["version"] != MANIFEST_VERSION:
+            raise Exception(f"Unsupported checkpoint manifest version: {data['version']}")
+        return data["continuations"]
+
+    def _update_manifest(self, state):
+        """Describe the continuations in state's chain in the manifest file.
+
+        The manifest is only rewritten when the chain refers to continuations that
+        it does not describe yet, and removed when it refers to none.
+        """
+        keys = {key for bite in chain(state) if isinstance(key := reference(bite.func), str)}
+        if not keys:
+            self.manifest_file.unlink(missing_ok=True)
+            self._described = set()
+            return
+        if keys <= self._described:
+            return
+        self._described |= keys
+        write_atomic(
+            self.manifest_file, json.dumps(describe(sorted(self._described))).encode()
+        )
+
+    def _keep(self, keys):
+        self.objects.retain(keys)
+        self.objects.release(self._keys)
+        self._keys = keys
+
+    def finish(self, rval):
         if self.cleanup:
-            if self.file.exists():
-                self.file.unlink()
+            self.remove()
+            if self.history:
+                self.history.clear()
         else:
-            self.save(FunBite(returns, rval), self.file.open("wb"))
-        return rval
+            self.write(FunBite(returns, rval))
+
+    def write(self, state):
+        """Write state to the file and return its size in bytes."""
+        self._update_manifest(state)
+        with self.file.open("wb") as f:
+            if not self.objects:
+                self.save(state, f)
+                return f.tell()
+            keys = self.objects.dump(state, f)
+            size = f.tell()
+        self._keep(keys)
+        return size
+
+    def remove(self):
+        if self.file.exists():
+            self.file.unlink()
+        self.manifest_file.unlink(missing_ok=True)
+        self._described = set()
+        if self.objects:
+            self._keep([])
+
+    def store(self, state):
+        """Save a checkpoint, recording its size if measure is True."""
+        size = self.write(state)
+        if self.history:
+            self.history.append(state)
+        if self.measure:
+            self.records.append(
+                SaveRecord(
+                    time=time.time(),
+                    size=size,
+                    variables=variable_sizes(state),
+                )
+            )
+
+    def rollback(self, steps=1):
+        """Go back to a previous checkpoint in the history.
+
+        The checkpoint becomes the current one, and the more recent checkpoints are
+        discarded, so that the next run resumes from it.
+
+        Args:
+            steps: How many checkpoints to go back from the latest one
+
+        Returns:
+            The state of the restored checkpoint.
+        """
+        if not self.history:
+            raise TypeError("rollback requires a Checkpointer with a history")
+        available = self.history.steps()
+        if not 0 <= steps < len(available):
+            raise IndexError(f"Cannot go back {steps} steps: there are {len(available)}")
+        step = available[-1 - steps]
+        state = self.history.load(step)
+        self.history.truncate(step)
+        self.write(state)
+        return state
+
+    def histogram(self):
+        """Return the size of each variable over time.
+
+        Returns:
+            A dictionary mapping "function.variable" to the list of its sizes in
+            each recorded checkpoint (0 when it was not captured).
+        """
+        keys = {k: None for r in self.records for k in r.variables}
+        return {k: [r.variables.get(k, 0) for r in self.records] for k in keys}
 
     def __enter__(self):
         assert self._token is None
@@ -47,10 +250,153 @@ class Checkpointer:
         self._token = None
 
 
+class TaskCheckpointer(Checkpointer):
+    """Checkpointer for one task of a SharedCheckpointer.
+
+    Checkpoints are serialized in the calling thread, so that later changes to the
+    captured objects do not leak into them, and written by the shared writer.
+    """
+
+    def __init__(self, shared, key, **options):
+        super().__init__(shared.directory / f"{key}{shared.suffix}", **options)
+        self.shared = shared
+        self.key = key
+
+    def exists(self):
+        # The last checkpoint may still be waiting in the writer's queue
+        self.shared.flush()
+        return super().exists()
+
+    def restore(self):
+        self.shared.flush()
+        return super().restore()
+
+    def write(self, state):
+        self._update_manifest(state)
+        buf = BytesIO()
+        self.save(state, buf)
+        data = buf.getvalue()
+        self.shared.queue.put((self.file, data))
+        return len(data)
+
+    def remove(self):
+        self.shared.queue.put((self.file, None))
+        self.manifest_file.unlink(missing_ok=True)
+        self._described = set()
+
+
+class SharedCheckpointer:
+    """Checkpointer shared by many tasks running in different threads.
+
+    Each task gets its own TaskCheckpointer, keyed by the task, which writes to
+    ``<directory>/<key><suffix>``. Saving a checkpoint only serializes it and puts
+    it in a queue, without taking any lock. A single writer thread drains the queue,
+    keeps only the latest checkpoint of each task when it falls behind, and
+    replaces each file atomically.
+
+    Args:
+        directory: The directory to write the checkpoints in
+        suffix: The suffix of the checkpoint files
+        options: Options for each task's Checkpointer, except dedup
+    """
+
+    def __init__(self, directory, suffix=".pkl", **options):
+        if options.get("dedup", False):
+            raise TypeError("dedup cannot be used with a SharedCheckpointer")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.suffix = suffix
+        self.options = options
+        self.queue = SimpleQueue()
+        self.error = None
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def task(self, key):
+        return TaskCheckpointer(self, key, **self.options)
+
+    def run(self, key, func, *args, **kwargs):
+        return self.task(key).run(func, *args, **kwargs)
+
+    def _write_loop(self):
+        queue = self.queue
+        while True:
+            pending = {}
+            waiting = []
+            item = queue.get()
+            while True:
+                match item:
+                    case None:
+                        waiting.append(None)
+                    case threading.Event():
+                        waiting.append(item)
+                    case (path, data):
+                        pending[path] = data
+                if queue.empty():
+                    break
+                item = queue.get()
+            for path, data in pending.items():
+                try:
+                    self._write_file(path, data)
+                except Exception as exc:
+                    self.error = exc
+            # Events queued behind the stop signal are set as well, so that a
+            # flush that races close does not wait forever
+            for event in waiting:
+                if event is not None:
+                    event.set()
+            if None in waiting:
+                return
+
+    def _write_file(self, path, data):
+        if data is None:
+            if path.exists():
+                path.unlink()
+            return
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def flush(self):
+        """Wait until all the checkpoints saved so far are written."""
+        if self.writer.is_alive():
+            event = threading.Event()
+            self.queue.put(event)
+            # The writer may have stopped before it got to the event
+            while not event.wait(0.1) and self.writer.is_alive():
+                pass
+        if (error := self.error) is not None:
+            self.error = None
+            raise error
+
+    def close(self):
+        """Write all pending checkpoints and stop the writer thread."""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        if (error := self.error) is not None:
+            self.error = None
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 @continuator
 def checkpoint(x=None, *, continuation):
     assert continuation is not None
     cont = continuation(x)
     if (chk := checkpointer.get()) is not None:
-        chk.save(cont, chk.file.open("wb"))
+        chk.store(cont)
     return cont
+
+
+def _checkpoint_passthrough(x=None):
+    # Without a Checkpointer, checkpoint only passes x to its continuation
+    return x if checkpointer.get() is None else NotImplemented
+
+
+checkpoint.__passthrough__ = _checkpoint_passthrough
@@ -0,0 +1,90 @@
+import pickle
+from io import BytesIO
+from pathlib import Path
+
+from .store import ObjectStore, write_atomic
+
+
+class History:
+    """Ring buffer of the last checkpoints of a computation.
+
+    Each entry is a skeleton of the FunBite chain in which the large captured
+    values are replaced by the hash of their contents. The values themselves are
+    stored once per distinct content in an ObjectStore under ``objects/``, and
+    deleted when no entry refers to them anymore, so unchanged arguments are shared
+    by all the entries and the disk usage stays bounded.
+
+    Args:
+        directory: The directory to store the history in
+        size: The maximal number of checkpoints to keep
+        min_size: Captured values smaller than this are stored in the skeleton
+    """
+
+    def __init__(self, directory, size, min_size=256):
+        self.directory = Path(directory)
+        self.size = size
+        self.min_size = min_size
+        self.store = None
+        self.entries = None
+
+    def _entry_path(self, step):
+        return self.directory / f"{step}.ckpt"
+
+    def _open(self):
+        if self.entries is not None:
+            return
+        self.store = ObjectStore(self.directory / "objects", min_size=self.min_size)
+        self.entries = {}
+        for path in self.directory.glob("*.ckpt"):
+            keys, _ = pickle.loads(path.read_bytes())
+            self.entries[int(path.stem)] = keys
+            self.store.retain(keys)
+        self.store.collect()
+
+    def steps(self):
+        """Return the steps in the history, from oldest to newest."""
+        self._open()
+        return sorted(self.entries)
+
+    def append(self, state):
+        """Add a checkpoint to the history, evicting the oldest one if it is full.
+
+        Returns:
+            The step number of the new checkpoint.
+        """
+        self._open()
+        buf = BytesIO()
+        keys = self.store.dump(state, buf)
+        step = max(self.entries, default=-1) + 1
+        write_atomic(self._entry_path(step), pickle.dumps((keys, buf.getvalue())))
+        self.entries[step] = keys
+        self.store.retain(keys)
+        while len(self.entries) > self.size:
+            self.drop(min(self.entries))
+        return step
+
+    def load(self, step):
+        """Load the checkpoint at the given step."""
+        self._open()
+        if step not in self.entries:
+            raise KeyError(f"No checkpoint at step {step}")
+        _, skeleton = pickle.loads(self._entry_path(step).read_bytes())
+        state, _ = self.store.load(BytesIO(skeleton))
+        return state
+
+    def drop(self, step):
+        """Remove the checkpoint at the given step."""
+        self._open()
+        keys = self.entries.pop(step)
+        self._entry_path(step).unlink()
+        self.store.release(keys)
+
+    def truncate(self, step):
+        """Remove all the checkpoints after the given step."""
+        for s in self.steps():
+            if s > step:
+                self.drop(s)
+
+    def clear(self):
+        for s in self.steps():
+            self.drop(s)
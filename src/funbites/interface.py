@@ -1,44 +1,230 @@
 import ast
+import hashlib
 import inspect
 import textwrap
 import warnings
+from functools import partial
+from types import CellType, CodeType, FunctionType
 
-from .runtime import FunBite, FunBiteYield
+from . import cache
+from .registry import Origin, register
+from .runtime import FunBite, FunBiteThrow, FunBiteYield, call, passthrough
 from .split import SplitState, Splitter
 from .strategy import MainStrategy
 
+# When a list, the functions split from their source are recorded in it, as
+# (fn, strategy, tree, source_hash)
+recording = None
 
-def split(fn, strategy):
-    frame = inspect.currentframe()
-    locs = frame.f_back.f_locals
-    tree = ast.parse(textwrap.dedent(inspect.getsource(fn)))
+# The names the generated code uses to refer to the runtime
+RUNTIME = {
+    "__FunBite": FunBite,
+    "__FunBiteYield": FunBiteYield,
+    "__FunBiteThrow": FunBiteThrow,
+    "__FunCall": call,
+    "__FunPass": passthrough,
+}
+
+
+def _closure_values(fn):
+    """Return the values of the free variables of fn that are already bound."""
+    values = {}
+    for name, cell in zip(fn.__code__.co_freevars, fn.__closure__ or ()):
+        try:
+            values[name] = cell.cell_contents
+        except ValueError:
+            pass
+    return values
+
+
+def _split_tree(fn, strategy):
+    """Split fn from its source code.
+
+    Returns:
+        A (tree, source_hash) tuple, where tree is an ast.Module that defines the
+        continuations, or is None if fn has no split points.
+    """
+    try:
+        source = textwrap.dedent(inspect.getsource(fn))
+    except OSError as exc:
+        raise OSError(
+            f"Cannot split {fn.__qualname__}: its source code is not available and"
+            " it is not in the split cache"
+        ) from exc
+    source_hash = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+    tree = ast.parse(source)
     fdef = tree.body[0]
     context = SplitState(
         strategy=strategy,
         name=fn.__name__,
         globals=fn.__globals__,
-        locals=locs,
+        locals=_closure_values(fn),
     )
     fdef = Splitter.run(fdef, context=context)
     if fdef is None:
-        warnings.warn(f"No split points found in function {fn.__name__}")
-        return fn
+        return None, source_hash
     elif isinstance(fdef, list):
         tree.body[:] = fdef
     else:
         tree.body[0] = fdef
     tree = ast.fix_missing_locations(tree)
     tree = ast.increment_lineno(tree, fn.__code__.co_firstlineno - 1)
-    fn.__globals__.update({"__FunBite": FunBite, "__FunBiteYield": FunBiteYield})
-    exec(compile(tree, fn.__code__.co_filename, "exec"), fn.__globals__)
-    return strategy.wrap(fn.__globals__[fn.__name__], fn)
+    return tree, source_hash
 
 
-def checkpointable(fn):
-    func = split(fn, MainStrategy())
+def _enclose(tree, fn):
+    """Define the continuations in a factory function that is never called.
+
+    The parameters of the factory are the free variables of fn and the names in
+    RUNTIME, so that the continuations are compiled as closures over them. The
+    name of fn stays global, like in the original function, unless it is a free
+    variable.
+    """
+    freevars = fn.__code__.co_freevars
+    params = [*freevars, *(name for name in RUNTIME if name not in freevars)]
+    body = list(tree.body)
+    if fn.__name__ not in freevars:
+        body.insert(0, ast.Global(names=[fn.__name__]))
+    factory = ast.FunctionDef(
+        name="__funbites_closure__",
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg=name) for name in params],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        ),
+        body=body,
+        decorator_list=[],
+    )
+    module = ast.Module(body=[ast.copy_location(factory, tree.body[0])], type_ignores=[])
+    return ast.fix_missing_locations(module)
+
+
+def _compile(fn, strategy):
+    """Split fn from its source code and compile the continuations.
+
+    Returns:
+        A (code, names, source_hash) tuple, where code is a module that defines
+        the factory of the functions in names (see _enclose), or is None if fn has
+        no split points.
+    """
+    tree, source_hash = _split_tree(fn, strategy)
+    if recording is not None:
+        recording.append((fn, strategy, tree, source_hash))
+    if tree is None:
+        return None, (), source_hash
+    code = compile(_enclose(tree, fn), fn.__code__.co_filename, "exec")
+    return code, tuple(defn.name for defn in tree.body), source_hash
+
+
+def _instantiate(code, fn):
+    """Create the continuations of fn from the code compiled by _compile.
+
+    The factory is not called: the continuations are created from its code, with
+    the cells of fn for its free variables, so that they share them with fn.
+
+    Returns:
+        A dictionary of the continuations, by name.
+    """
+    (factory,) = [c for c in code.co_consts if isinstance(c, CodeType)]
+    codes = [c for c in factory.co_consts if isinstance(c, CodeType)]
+    cells = dict(zip(fn.__code__.co_freevars, fn.__closure__ or ()))
+    cells.update(
+        {name: CellType(value) for name, value in RUNTIME.items() if name not in cells}
+    )
+    own = {c.co_name: CellType() for c in codes if c.co_name not in cells}
+    cells.update(own)
+    prefix = fn.__qualname__[: -len(fn.__name__)]
+    funcs = {}
+    for c in codes:
+        closure = tuple(cells[name] for name in c.co_freevars)
+        func = FunctionType(c, fn.__globals__, c.co_name, None, closure)
+        func.__qualname__ = prefix + c.co_name
+        funcs[c.co_name] = func
+    for name, cell in own.items():
+        cell.cell_contents = funcs[name]
+    entry = funcs[fn.__name__]
+    entry.__defaults__ = fn.__defaults__
+    entry.__kwdefaults__ = {**(fn.__kwdefaults__ or {}), "continuation": None}
+    return funcs
+
+
+def _presplit(fn, strategy):
+    """Look for continuations of fn generated ahead of time by funbites.aot.
+
+    Returns:
+        A (None, names, source_hash) tuple, or None if fn was not split ahead of
+        time with the same strategy.
+    """
+    entry = fn.__globals__.get("__funbites_splits__", {}).get(fn.__qualname__, None)
+    if entry is None:
+        return None
+    key, names, source_hash = entry
+    if key != cache.strategy_key(strategy):
+        return None
+    return None, names, source_hash
+
+
+def split(fn, strategy):
+    entry = _presplit(fn, strategy)
+    split_cache = cache.split_cache
+    if entry is None:
+        entry = split_cache and split_cache.get(fn, strategy)
+    if not entry:
+        entry = _compile(fn, strategy)
+        if split_cache:
+            split_cache.put(fn, strategy, entry)
+    code, names, source_hash = entry
+    if not names:
+        warnings.warn(f"No split points found in function {fn.__name__}")
+        return fn
+    if code is None:
+        funcs = {name: fn.__globals__[name] for name in names}
+    else:
+        funcs = _instantiate(code, fn)
+    module = fn.__globals__.get("__name__", fn.__module__)
+    origin = Origin(
+        module=module,
+        qualname=fn.__qualname__,
+        filename=fn.__code__.co_filename,
+        lineno=fn.__code__.co_firstlineno,
+        source_hash=source_hash,
+    )
+    for name in names:
+        register(f"{module}:{name}", funcs[name], origin)
+    return strategy.wrap(funcs[fn.__name__], fn)
+
+
+def checkpointable(fn=None, *, strategy=None, atomic=False):
+    """Make a function checkpointable.
+
+    Args:
+        strategy: The Strategy that determines where to split the function
+            (MainStrategy by default).
+        atomic: Run the loops that contain no split points other than continue and
+            break natively, without splitting at their continue and break.
+    """
+    if fn is None:
+        return partial(checkpointable, strategy=strategy, atomic=atomic)
+    if strategy is not None and atomic:
+        raise TypeError("Pass atomic=True to the strategy instead")
+    func = split(fn, strategy or MainStrategy(atomic=atomic))
     func.__is_continuator__ = True
     return func
 
 
-def resumable(fn):
-    return split(fn, MainStrategy())
+def resumable(fn=None, *, buffer=None):
+    """Make a generator resumable.
+
+    Args:
+        buffer: If given, run the generator ahead until this many values are
+            buffered, and serve them from the buffer. This amortizes the cost of
+            going through the trampoline when yielding many values.
+    """
+    if fn is None:
+        return partial(resumable, buffer=buffer)
+    func = split(fn, MainStrategy())
+    if buffer:
+        func.buffer = buffer
+    return func
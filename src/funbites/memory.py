@@ -0,0 +1,159 @@
+import dis
+import gc
+import sys
+from dataclasses import dataclass, field
+from types import BuiltinFunctionType, CodeType, FunctionType, ModuleType
+
+from .registry import reference
+from .runtime import FunBite, FunBiteYield, Loop, chain
+
+# Objects that belong to the program rather than to the state of a computation
+_SHARED = (type, ModuleType, FunctionType, BuiltinFunctionType, CodeType)
+
+
+@dataclass
+class ArgumentMemory:
+    """Memory retained by one argument of a bite.
+
+    Attributes:
+        name: The parameter the argument is bound to, or "#i" for the i-th
+            positional argument if the function does not have that many
+        size: The size in bytes of the objects reachable from the argument that
+            were not already counted
+        type: The name of the argument's type
+        used: Whether the function reads the parameter (None if unknown)
+    """
+
+    name: str
+    size: int
+    type: str
+    used: bool = None
+
+
+@dataclass
+class BiteMemory:
+    """Memory retained by one bite of a continuation chain.
+
+    Attributes:
+        func: The registry key of the function, or its qualified name
+        kind: "FunBite" or "FunBiteYield"
+        size: The size of the bite itself and of its arguments, not counting the
+            nested bites
+        arguments: The memory retained by each argument
+    """
+
+    func: str
+    kind: str
+    size: int
+    arguments: list = field(default_factory=list)
+
+    @property
+    def unused(self):
+        """The arguments that the function does not need."""
+        return [arg for arg in self.arguments if arg.used is False]
+
+
+def _retained(obj, seen):
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (*_SHARED, FunBite, FunBiteYield)):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        stack.extend(gc.get_referents(o))
+    return size
+
+
+def _reads(code):
+    """Return the names of the local variables that code reads."""
+    names = set(code.co_cellvars)
+    for instr in dis.get_instructions(code):
+        if instr.opname.startswith(("LOAD_FAST", "LOAD_DEREF", "STORE_FAST_LOAD_FAST")):
+            argval = instr.argval
+            names.update(argval if isinstance(argval, tuple) else [argval])
+    return names
+
+
+def _name(func):
+    key = reference(func)
+    if isinstance(key, str):
+        return key
+    return getattr(func, "__qualname__", type(func).__qualname__)
+
+
+def chain_memory(state):
+    """Measure the memory retained by a chain of continuations.
+
+    Each object is counted once, for the first argument that refers to it, going
+    down the chain from the current bite. Classes, modules, functions and code are
+    not counted, since they are not part of the state of the computation.
+
+    Arguments that the function never reads are reported with ``used=False``:
+    they are kept alive by the chain for no reason, which points to a leak in the
+    generated code.
+
+    Args:
+        state: A FunBite or FunBiteYield, or a Loop (e.g. a running generator)
+
+    Returns:
+        A list of BiteMemory, from the current bite to the outermost continuation.
+    """
+    if isinstance(state, Loop):
+        state = state.state
+    if not isinstance(state, (FunBite, FunBiteYield)):
+        return []
+    seen = set()
+    results = []
+    for bite in chain(state):
+        func = bite.func
+        code = getattr(func, "__code__", None)
+        kwargs = getattr(bite, "kwargs", {})
+        size = sys.getsizeof(bite) + sys.getsizeof(bite.args) + sys.getsizeof(kwargs)
+        seen.update((id(bite.args), id(kwargs)))
+        if isinstance(bite, FunBiteYield):
+            size += _retained(bite.value, seen)
+        if code is not None:
+            names = code.co_varnames[: code.co_argcount + code.co_kwonlyargcount]
+            reads = _reads(code)
+        else:
+            names, reads = (), None
+        report = BiteMemory(func=_name(func), kind=type(bite).__name__, size=size)
+        # The last positional parameter of a continuation receives the value of
+        # the split point, which it is free to ignore
+        resume = code.co_argcount - 1 if code and isinstance(reference(func), str) else None
+        for i, value in enumerate(bite.args):
+            name = names[i] if i < len(names) else f"#{i}"
+            arg = _argument(name, value, reads, seen)
+            if i == resume:
+                arg.used = None
+            report.arguments.append(arg)
+        for name, value in kwargs.items():
+            report.arguments.append(_argument(name, value, reads, seen))
+        report.size += sum(arg.size for arg in report.arguments)
+        results.append(report)
+    return results
+
+
+def _argument(name, value, reads, seen):
+    if isinstance(value, (FunBite, FunBiteYield)):
+        # Nested bites are reported on their own
+        return ArgumentMemory(name=name, size=0, type=type(value).__name__, used=True)
+    return ArgumentMemory(
+        name=name,
+        size=_retained(value, seen),
+        type=type(value).__qualname__,
+        used=None if reads is None else name in reads,
+    )
+
+
+def format_chain_memory(reports):
+    """Format the result of chain_memory as a table."""
+    lines = []
+    for report in reports:
+        lines.append(f"{report.size:>10}  {report.kind} {report.func}")
+        for arg in report.arguments:
+            flag = "  UNUSED" if arg.used is False else ""
+            lines.append(f"{arg.size:>10}    {arg.name}: {arg.type}{flag}")
+    return "\n".join(lines)
@@ -0,0 +1,59 @@
+import builtins
+from itertools import islice
+
+from .interface import resumable
+
+_END = object()
+
+
+@resumable
+def map(func, source):
+    for x in source:
+        yield func(x)
+
+
+@resumable
+def filter(pred, source):
+    for x in source:
+        if pred(x):
+            yield x
+
+
+@resumable
+def chunk(source, size):
+    iterator = iter(source)
+    while True:
+        items = list(islice(iterator, size))
+        if not items:
+            return
+        yield items
+
+
+@resumable
+def batch(func, source, size):
+    iterator = iter(source)
+    while True:
+        items = list(islice(iterator, size))
+        if not items:
+            return
+        yield func(items)
+
+
+@resumable
+def flatten(source):
+    for items in source:
+        for x in items:
+            yield x
+
+
+@resumable
+def zip(*sources):
+    iterators = list(builtins.map(iter, sources))
+    while True:
+        items = []
+        for iterator in iterators:
+            item = next(iterator, _END)
+            if item is _END:
+                return
+            items.append(item)
+        yield tuple(items)
@@ -0,0 +1,164 @@
+import importlib
+import re
+import sys
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+continuations = {}
+origins = {}
+aliases = {}
+_by_name = {}
+
+MANIFEST_VERSION = 1
+
+# The suffix that MainStrategy.identify gives to the names of continuations
+_hashed = re.compile(r"__[0-9a-f]{16}(_\d+)?$")
+
+# The manifest of the checkpoint being loaded, if any
+manifest = ContextVar("manifest", default=None)
+
+
+@dataclass(frozen=True)
+class Origin:
+    """Where a continuation comes from.
+
+    Attributes:
+        module: The module the original function was defined in
+        qualname: The qualified name of the original function
+        filename: The file the original function was defined in
+        lineno: The first line of the original function
+        source_hash: A hash of the original function's source code
+    """
+
+    module: str
+    qualname: str
+    filename: str = None
+    lineno: int = None
+    source_hash: str = None
+
+
+def _split_key(key):
+    module, _, name = key.rpartition(":")
+    return module, name
+
+
+def register(key, func, origin=None):
+    key = sys.intern(key)
+    func.__continuation_id__ = key
+    continuations[key] = func
+    if origin is not None:
+        origins[key] = origin
+    _by_name.setdefault(_split_key(key)[1], set()).add(key)
+    return func
+
+
+def reference(func):
+    """Return the registry key for func, or func itself if it is not registered."""
+    key = getattr(func, "__continuation_id__", None)
+    if key is not None and continuations.get(key, None) is func:
+        return key
+    return func
+
+
+def preload(*modules):
+    """Import modules so that their continuations are registered ahead of time.
+
+    Args:
+        modules: Module names, or continuation keys of the form "module:name".
+            Each module is imported once.
+    """
+    for module in {_split_key(m)[0] if ":" in m else m for m in modules}:
+        if module not in sys.modules:
+            importlib.import_module(module)
+
+
+def lookup(key):
+    if (func := continuations.get(key, None)) is not None:
+        return func
+    module, name = _split_key(key)
+    try:
+        # Importing the module splits its functions, which registers them
+        importlib.import_module(module)
+    except ModuleNotFoundError as exc:
+        # The module may have been renamed, but errors in the module are real
+        if exc.name is None or not (module == exc.name or module.startswith(f"{exc.name}.")):
+            raise
+    if (func := continuations.get(key, None)) is not None:
+        return func
+    # The module may have been renamed. The names of continuations carry the hash
+    # of the code above their split point, so a continuation with the same name
+    # that is registered only once resumes from the same point. The code below the
+    # split point may differ: resolve adapts the arguments with the manifest, as it
+    # does for any continuation. Entry points carry no hash.
+    candidates = _by_name.get(name, ()) if _hashed.search(name) else ()
+    if len(candidates) == 1:
+        (other,) = candidates
+        return continuations[other]
+    raise LookupError(f"Continuation {key!r} could not be found")
+
+
+def alias(old, new):
+    """Resume the continuations saved as old with the continuation new.
+
+    This can be used to migrate checkpoints across changes to the code above a
+    split point, after checking that the continuations are compatible.
+    """
+    aliases[old] = new
+
+
+def parameters(func):
+    code = func.__code__
+    return list(code.co_varnames[: code.co_argcount])
+
+
+def describe(keys):
+    """Return a manifest describing the continuations with the given keys.
+
+    The manifest records the parameters of each continuation, so that checkpoints
+    can be resumed after the code below the split point changes.
+    """
+    entries = {}
+    for key in keys:
+        origin = origins.get(key, None)
+        entries[key] = {
+            "params": parameters(continuations[key]),
+            "source_hash": origin and origin.source_hash,
+        }
+    return {"version": MANIFEST_VERSION, "continuations": entries}
+
+
+def resolve(ref, args, kwargs=()):
+    """Resolve a reference to a continuation, adapting args to its current signature.
+
+    Args:
+        ref: A continuation key, or a function
+        args: The positional arguments saved for the continuation. The last
+            parameter, which receives the resumption value, may be missing.
+        kwargs: The names of the keyword arguments saved for the continuation
+
+    Returns:
+        A (func, args) tuple.
+    """
+    if not isinstance(ref, str):
+        return ref, args
+    func = lookup(aliases.get(ref, ref))
+    m = manifest.get()
+    if m is None or (entry := m.get(ref, None)) is None:
+        return func, args
+    old = [p for p in entry["params"] if p not in kwargs]
+    new = [p for p in parameters(func) if p not in kwargs]
+    if old == new:
+        return func, args
+    # Match the captured variables by name. The last parameter receives the
+    # resumption value, so it is matched by position.
+    values = dict(zip(old[:-1], args))
+    missing = [name for name in new[:-1] if name not in values]
+    if missing:
+        raise LookupError(
+            f"Continuation {ref!r} cannot be resumed: it now needs variables"
+            f" {missing} that the checkpoint does not have"
+        )
+    new_args = [values[name] for name in new[:-1]]
+    if len(args) == len(old):
+        new_args.append(args[-1])
+    return func, tuple(new_args)
@@ -1,49 +1,207 @@
-import importlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
 
-ABSENT = object()
+from .registry import reference, resolve
+
+# How deep continuations may be nested when pass-through continuators run them
+# inline, before going back to the trampoline
+INLINE_DEPTH = 50
+
+_inline = threading.local()
 
 
 class Loop:
-    def __init__(self, start, args, kwargs, is_generator):
-        self.is_generator = is_generator
-        self.state = start(*args, **kwargs)
+    buffer = None
+    error = None
 
-    def step(self):
-        yields = ABSENT
-        self.state = self.state.step()
-        if isinstance(self.state, FunBiteYield):
-            yields = self.state.value
-            self.state = self.state.continuation(self.state.value)
-        return yields, self.state
+    def __init__(self, start, args, kwargs, is_generator, buffer=None):
+        self.is_generator = is_generator
+        self.state = FunBite(start, *args, **kwargs)
+        if buffer:
+            self.buffer_size = buffer
+            self.buffer = deque()
 
     def run(self):
-        while True:
-            if not isinstance(self.state, FunBite):
-                return self.state
-            self.step()
+        state = self.state
+        while isinstance(state, FunBite):
+            state = state.func(*state.args, **state.kwargs)
+        self.state = state
+        return state
+
+    def advance(self, value):
+        state = self.state
+        try:
+            if isinstance(state, FunBiteYield):
+                state = state.func(*state.args, value)
+            while isinstance(state, FunBite):
+                state = state.func(*state.args, **state.kwargs)
+        except BaseException:
+            self.state = None
+            raise
+        self.state = state
+        if isinstance(state, FunBiteYield):
+            return state.value
+        raise StopIteration(state)
 
     def __iter__(self):
         if not self.is_generator:
-            raise TypeError(f"{self.start} is not a generator")
+            raise TypeError("This function is not a generator")
         return self
 
+    def fill(self):
+        """Run the generator until buffer_size values are buffered.
+
+        Filling stops early before a continuator (e.g. a checkpoint) is entered, so
+        that values are never left in the buffer when a continuator sees the state.
+        """
+        buffer = self.buffer
+        size = self.buffer_size
+        state = self.state
+        continuators = {}
+        try:
+            while len(buffer) < size:
+                if isinstance(state, FunBiteYield):
+                    state = state.func(*state.args, None)
+                while isinstance(state, FunBite):
+                    func = state.func
+                    if (is_cont := continuators.get(func, None)) is None:
+                        is_cont = getattr(func, "__is_continuator__", False)
+                        continuators[func] = is_cont
+                    if is_cont and buffer:
+                        self.state = state
+                        return
+                    state = func(*state.args, **state.kwargs)
+                if not isinstance(state, FunBiteYield):
+                    break
+                buffer.append(state.value)
+        except Exception as exc:
+            # Deliver the values produced so far before raising
+            self.error = exc
+            state = None
+        self.state = state
+
     def __next__(self):
-        while True:
-            if not isinstance(self.state, FunBite):
-                raise StopIteration(self.state)
-            yields, _ = self.step()
-            if yields is not ABSENT:
-                return yields
-
-
-def loop(start, args, kwargs):
-    result = start(*args, **kwargs)
-    while isinstance(result, FunBite):
-        result = result.step()
+        if (buffer := self.buffer) is None:
+            return self.advance(None)
+        if not buffer and self.error is None:
+            self.fill()
+        if buffer:
+            return buffer.popleft()
+        if (error := self.error) is not None:
+            self.error = None
+            raise error
+        raise StopIteration(self.state)
+
+    def send(self, value):
+        if self.buffer is not None:
+            if value is not None:
+                raise TypeError("can't send non-None value to a buffered generator")
+            return next(self)
+        if value is not None and isinstance(self.state, FunBite):
+            raise TypeError("can't send non-None value to a just-started generator")
+        return self.advance(value)
+
+    def throw(self, exc):
+        if isinstance(exc, type):
+            exc = exc()
+        if self.buffer:
+            raise TypeError("can't throw into a buffered generator with pending values")
+        if isinstance(self.state, FunBiteYield):
+            return self.advance(FunBiteThrow(exc))
+        self.state = None
+        raise exc
+
+    def close(self):
+        if self.buffer:
+            self.buffer.clear()
+        if isinstance(self.state, FunBiteYield):
+            try:
+                self.throw(GeneratorExit)
+            except (GeneratorExit, StopIteration):
+                pass
+            else:
+                raise RuntimeError("generator ignored GeneratorExit")
+        self.state = None
+
+
+def loop(start, args, kwargs, timeslice=None):
+    """Run start(*args, **kwargs) to completion, or for at most timeslice seconds.
+
+    Args:
+        start: The function to call
+        args: The positional arguments
+        kwargs: The keyword arguments
+        timeslice: If given, the time in seconds after which to stop. This is
+            checked between bites, so a single long bite may overrun it.
+
+    Returns:
+        The result, or the pending FunBite if the time slice ran out.
+    """
+    if timeslice is None:
+        result = start(*args, **kwargs)
+        while isinstance(result, FunBite):
+            result = result.step()
+        return result
+    deadline = perf_counter() + timeslice
+    with no_inline():
+        result = start(*args, **kwargs)
+        while isinstance(result, FunBite):
+            if perf_counter() >= deadline:
+                return result
+            result = result.step()
     return result
 
 
+@contextmanager
+def no_inline():
+    """Run all the continuations through the trampoline.
+
+    Drivers that preempt computations between bites use this, so that the bites
+    stay as small as the split points make them.
+    """
+    depth = getattr(_inline, "depth", 0)
+    _inline.depth = INLINE_DEPTH
+    try:
+        yield
+    finally:
+        _inline.depth = depth
+
+
+def passthrough(func, *args, continuation, **kwargs):
+    """Call a continuator that may only pass a value through to its continuation.
+
+    ``func.__passthrough__(*args, **kwargs)`` returns the value that func would pass
+    to its continuation without doing anything else, or NotImplemented if func has
+    to be called. In the former case, the continuation runs inline rather than
+    going through the trampoline, unless INLINE_DEPTH continuations are already
+    running inline.
+    """
+    depth = getattr(_inline, "depth", 0)
+    if depth < INLINE_DEPTH:
+        value = func.__passthrough__(*args, **kwargs)
+        if value is not NotImplemented:
+            _inline.depth = depth + 1
+            try:
+                if isinstance(continuation, FunBite):
+                    return continuation.step(value)
+                return continuation(value)
+            finally:
+                _inline.depth = depth
+    return FunBite(func, *args, continuation=continuation, **kwargs)
+
+
+def call(func, *args, continuation, **kwargs):
+    """Call func with the continuation if it is a continuator, else pass its result to it."""
+    if getattr(func, "__is_continuator__", False):
+        return func(*args, continuation=continuation, **kwargs)
+    return continuation(func(*args, **kwargs))
+
+
 class FunBite:
+    __slots__ = ("args", "func", "kwargs")
+
     def __init__(self, func, *args, **kwargs):
         self.func = func
         self.args = args
@@ -69,8 +227,92 @@ class FunBite:
     def execute(self, *args, **kwargs):
         return loop(self, args, kwargs)
 
+    def run_for(self, timeslice):
+        """Run for at most timeslice seconds.
+
+        Returns:
+            The result, or the pending FunBite to resume later.
+        """
+        return loop(self.step, (), {}, timeslice=timeslice)
+
+    def __reduce__(self):
+        if self.kwargs:
+            return (_restore_kw, (reference(self.func), self.args, self.kwargs))
+        return (_restore, (reference(self.func), *self.args))
+
 
 class FunBiteYield:
-    def __init__(self, value, continuation=None):
+    """Yield a value, then resume with func(*args, sent_value)."""
+
+    __slots__ = ("args", "func", "value")
+
+    def __init__(self, value, func, *args):
         self.value = value
-        self.continuation = continuation
+        self.func = func
+        self.args = args
+
+    @property
+    def continuation(self):
+        return FunBite(self.func, *self.args)
+
+    def step(self, value=None):
+        return self.func(*self.args, value)
+
+    def __reduce__(self):
+        return (_restore_yield, (reference(self.func), self.value, *self.args))
+
+
+class FunBiteThrow:
+    """Sent into a generator's continuation to raise an exception at the yield."""
+
+    __slots__ = ("exception",)
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def chain(state):
+    """Iterate over the FunBites in a chain, following the continuations.
+
+    Args:
+        state: A FunBite or FunBiteYield
+    """
+    stack = [state]
+    while stack:
+        state = stack.pop()
+        yield state
+        for value in (*state.args, *getattr(state, "kwargs", {}).values()):
+            if isinstance(value, (FunBite, FunBiteYield)):
+                stack.append(value)
+
+
+def captured(state):
+    """Iterate over the values captured in a chain of FunBites.
+
+    Args:
+        state: A FunBite or FunBiteYield
+
+    Yields:
+        (func, key, value) for each captured value that is not a FunBite, where key
+        is the index of a positional argument or the name of a keyword argument.
+    """
+    for bite in chain(state):
+        kwargs = getattr(bite, "kwargs", {})
+        for key, value in (*enumerate(bite.args), *kwargs.items()):
+            if not isinstance(value, (FunBite, FunBiteYield)):
+                yield bite.func, key, value
+
+
+def _restore(ref, *args):
+    func, args = resolve(ref, args)
+    return FunBite(func, *args)
+
+
+def _restore_kw(ref, args, kwargs):
+    func, args = resolve(ref, args, kwargs)
+    return FunBite(func, *args, **kwargs)
+
+
+def _restore_yield(ref, value, *args):
+    func, args = resolve(ref, args)
+    return FunBiteYield(value, func, *args)
@@ -0,0 +1,138 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import SimpleQueue
+
+from .checkpoint import Checkpointer, checkpointer
+from .runtime import FunBite, no_inline
+
+
+class Task:
+    __slots__ = ("checkpointer", "key", "state")
+
+    def __init__(self, key, state, checkpointer=None):
+        self.key = key
+        self.state = state
+        self.checkpointer = checkpointer
+
+
+class Scheduler:
+    """Drive many continuations round-robin in a single trampoline.
+
+    Each task runs for at most ``quantum`` bites before the next task gets a turn.
+    While a task runs, its Checkpointer (if any) is the active one, so that
+    checkpoints are saved to the right place.
+
+    Tasks may be submitted from other threads with ``deliver``, after announcing
+    them with ``expect``. ``run`` waits for all expected tasks to be delivered.
+    """
+
+    def __init__(self, quantum=100):
+        self.quantum = quantum
+        self.ready = deque()
+        self.incoming = SimpleQueue()
+        self.pending = 0
+        self.results = {}
+        self.errors = {}
+
+    def submit(self, key, state, checkpointer=None):
+        self.ready.append(Task(key, state, checkpointer))
+
+    def expect(self, n=1):
+        self.pending += n
+
+    def deliver(self, key, state=None, checkpointer=None, error=None):
+        """Thread-safe submission of a task announced with ``expect``."""
+        self.incoming.put((key, state, checkpointer, error))
+
+    def receive(self, block):
+        while self.pending and (block or not self.incoming.empty()):
+            key, state, chk, error = self.incoming.get()
+            self.pending -= 1
+            if error is not None:
+                self.errors[key] = error
+            else:
+                self.submit(key, state, chk)
+            block = False
+
+    def step(self, task):
+        token = checkpointer.set(task.checkpointer)
+        try:
+            state = task.state
+            with no_inline():
+                for _ in range(self.quantum):
+                    if not isinstance(state, FunBite):
+                        break
+                    state = state.func(*state.args, **state.kwargs)
+            task.state = state
+        finally:
+            checkpointer.reset(token)
+        return not isinstance(state, FunBite)
+
+    def run(self):
+        ready = self.ready
+        while ready or self.pending:
+            self.receive(block=not ready)
+            if not ready:
+                continue
+            task = ready.popleft()
+            try:
+                done = self.step(task)
+            except Exception as exc:
+                self.errors[task.key] = exc
+                continue
+            if not done:
+                ready.append(task)
+                continue
+            if task.checkpointer is not None:
+                task.checkpointer.finish(task.state)
+            self.results[task.key] = task.state
+        return self.results
+
+
+def _is_checkpoint(path):
+    return path.is_file() and path.suffix != ".manifest" and not path.name.startswith(".")
+
+
+def resume_all(
+    directory,
+    pattern="*",
+    *,
+    max_workers=None,
+    scheduler=None,
+    **checkpointer_options,
+):
+    """Resume all the checkpoints in a directory.
+
+    Files are loaded in a thread pool and each continuation is handed to the
+    scheduler as soon as it is loaded, so that the computation starts while the
+    remaining files are still being read.
+
+    Args:
+        directory: The directory to scan for checkpoint files
+        pattern: A glob pattern for the checkpoint files. The manifests and
+            temporary files that Checkpointer writes next to them are skipped.
+        max_workers: The number of threads used to load the files
+        scheduler: The Scheduler to use (a new one is created by default)
+        checkpointer_options: Options for each file's Checkpointer
+
+    Returns:
+        A (results, errors) tuple of dictionaries mapping each file's path to its
+        result or to the exception it raised.
+    """
+    scheduler = scheduler or Scheduler()
+    paths = sorted(p for p in Path(directory).glob(pattern) if _is_checkpoint(p))
+    scheduler.expect(len(paths))
+
+    def load(path):
+        chk = Checkpointer(path, **checkpointer_options)
+        try:
+            scheduler.deliver(path, chk.restore(), chk)
+        except BaseException as exc:
+            scheduler.deliver(path, error=exc)
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        for path in paths:
+            pool.submit(load, path)
+        scheduler.run()
+    return scheduler.results, scheduler.errors
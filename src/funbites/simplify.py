@@ -1,4 +1,5 @@
 import ast
+from dataclasses import field
 
 from ovld import call_next, ovld, recurse
 
@@ -6,13 +7,22 @@ from .visit import NodeVisitor
 
 
 class TagIgnores(NodeVisitor):
+    """Tag whether each node contains a split point.
+
+    Tags are memoized in ``context.tags`` (node -> bool) rather than set on the
+    nodes themselves. A node missing from the table is treated as ignored.
+    """
+
     def reduce(self, node, results, context):
         return any(x for _, x in results)
 
     @ovld(priority=1)
     def __call__(self, node: ast.AST, context: object):
+        tags = context.tags
+        if (matches := tags.get(node, None)) is not None:
+            return matches
         matches = call_next(node, context) or context.strategy.is_split(node, context)
-        node.ignore = not matches
+        tags[node] = matches
         return matches
 
     def __call__(self, node: ast.Expr, context: object):
@@ -22,7 +32,25 @@ class TagIgnores(NodeVisitor):
         return False
 
 
+_tag = TagIgnores()
+
+
 class Simplify(NodeVisitor):
+    """Hoist split points out of expressions, tagging nodes along the way.
+
+    Subtrees that contain no split point are returned as they are without being
+    visited, and function bodies are made to end with a return or a raise.
+    """
+
+    hoists: set = field(default_factory=set)
+
+    def active(self, node, context):
+        return node in self.hoists or _tag(node, context)
+
+    def retag(self, node, context):
+        context.tags.pop(node, None)
+        return _tag(node, context)
+
     def collapse(self, node, hoist, recurse, context):
         stmts = []
         for fld in hoist:
@@ -40,6 +68,7 @@ class Simplify(NodeVisitor):
             assert not any(rval)
             setattr(node, fld, substmts)
 
+        self.retag(node, context)
         if isinstance(node, (ast.stmt, ast.excepthandler)):
             rval = None
             add = node
@@ -50,31 +79,48 @@ class Simplify(NodeVisitor):
                 targets=[ast.Name(id=newsym, ctx=ast.Store())],
                 value=node,
             )
+            _tag(add, context)
         stmts.append(add)
         return stmts, rval
 
-    def unignore_in_sequence(self, node_seq):
+    def unignore_in_sequence(self, node_seq, context):
         for n in node_seq:
-            if isinstance(n, ast.stmt):
+            if not isinstance(n, ast.AST) or isinstance(n, ast.stmt):
                 break
-            elif n.ignore:
-                n.hoist = True
+            elif not _tag(n, context):
+                self.hoists.add(n)
             else:
                 break
 
+    def guarantee_return(self, stmts):
+        match stmts[-1] if stmts else None:
+            case ast.Return() | ast.Raise():
+                pass
+            case ast.If(body=body, orelse=orelse):
+                self.guarantee_return(body)
+                self.guarantee_return(orelse)
+            case _:
+                stmts.append(ast.Return(value=ast.Constant(None)))
+
+    @ovld(priority=2)
+    def __call__(self, node: ast.FunctionDef, context):
+        rval = call_next(node, context)
+        self.guarantee_return(node.body)
+        return rval
+
     @ovld(priority=1)
     def __call__(self, node: ast.stmt, context):
-        if node.ignore and not getattr(node, "hoist", False):
-            return [node], None
-        else:
+        if self.active(node, context):
             return call_next(node, context)
+        else:
+            return [node], None
 
     @ovld(priority=1)
     def __call__(self, node: ast.expr, context):
-        if node.ignore and not getattr(node, "hoist", False):
-            return [], node
-        else:
+        if self.active(node, context):
             return call_next(node, context)
+        else:
+            return [], node
 
     def __call__(self, node: ast.AST, context):
         usually_recurse = {"body", "orelse", "cases"}
@@ -123,8 +169,6 @@ class Simplify(NodeVisitor):
                 *node.body,
             ],
         )
-        TagIgnores.run(make_iter, context=context)
-        TagIgnores.run(loop, context=context)
         stmts, expr = self([make_iter, loop], context)
         assert not any(expr)
         return stmts, None
@@ -201,8 +245,6 @@ class Simplify(NodeVisitor):
             ],
             finalbody=[],
         )
-        TagIgnores.run(cm, context=context)
-        TagIgnores.run(new_stmt, context=context)
         stmts, expr = self([cm, new_stmt], context)
         assert not any(expr)
         return stmts, None
@@ -216,24 +258,34 @@ class Simplify(NodeVisitor):
         )
 
     def __call__(self, node: ast.BinOp, context):
-        self.unignore_in_sequence([node.left, node.right])
+        self.unignore_in_sequence([node.left, node.right], context)
         return call_next(node, context)
 
     def __call__(self, node: ast.Compare, context):
-        self.unignore_in_sequence([node.left, *node.comparators])
+        self.unignore_in_sequence([node.left, *node.comparators], context)
         return self.collapse(node, hoist=["left", "comparators"], recurse=[], context=context)
 
     def __call__(self, node: ast.FunctionDef, context):
         return self.collapse(node, hoist=[], recurse=["body"], context=context)
 
     def __call__(self, node: list, context):
-        self.unignore_in_sequence(node)
+        self.unignore_in_sequence(node, context)
         stmts = []
         rval = []
         for x in node:
-            new_stmts, x = self(x, context)
+            if (
+                isinstance(x, ast.AST)
+                and not isinstance(x, ast.FunctionDef)
+                and not self.active(x, context)
+            ):
+                # Shortcut for the common case of a node without split points
+                if isinstance(x, (ast.stmt, ast.excepthandler)):
+                    stmts.append(x)
+                    x = None
+            else:
+                new_stmts, x = self(x, context)
+                stmts.extend(new_stmts)
             rval.append(x)
-            stmts.extend(new_stmts)
         return stmts, rval
 
     def __call__(self, node: ast.Name, context):
@@ -249,38 +301,6 @@ class Simplify(NodeVisitor):
         return [], node
 
 
-class GuaranteeReturn(NodeVisitor):
-    def __call__(self, node: object, context):
-        return False
-
-    def __call__(self, node: ast.Return, context):
-        return True
-
-    def __call__(self, node: ast.Raise, context):
-        return True
-
-    def __call__(self, node: ast.If, context):
-        self.add_to_stmt_list(node.body, context)
-        self.add_to_stmt_list(node.orelse, context)
-        return True
-
-    def __call__(self, node: ast.FunctionDef, context):
-        self.add_to_stmt_list(node.body, context)
-        return True
-
-    def add_to_stmt_list(self, stmts: list, context):
-        if not stmts:  # pragma: no cover
-            return stmts
-        last = stmts[-1]
-        add = not self(last, context)
-        if add:
-            stmts.append(ast.Return(value=ast.Constant(None)))
-        return True
-
-
 def simplify(tree, context):
-    TagIgnores.run(tree, context=context)
     Simplify.run(tree, context=context)
-    GuaranteeReturn.run(tree, context=context)
-    TagIgnores.run(tree, context=context)
     return tree
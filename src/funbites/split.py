@@ -21,6 +21,10 @@ class SplitState:
     count: object = field(default_factory=count)
     continuation: ast.AST = None
     definitions: dict = field(default_factory=dict)
+    tags: dict = field(default_factory=dict)
+    chainable: set = field(default_factory=set)
+    bound: set = None
+    in_try: bool = False
     variables: Variables = field(default_factory=Variables)
     strategy: Callable = None
     locals: dict = None
@@ -32,6 +36,30 @@ class SplitState:
     replace = dataclasses.replace
 
 
+def _bound_names(nodes):
+    """Return all the names that are bound anywhere in nodes, in any scope."""
+    names = set()
+    for n in (n for node in nodes for n in ast.walk(node)):
+        match n:
+            case ast.Name(id=name, ctx=ast.Store() | ast.Del()):
+                names.add(name)
+            case ast.arg(arg=name):
+                names.add(name)
+            case ast.FunctionDef(name=name) | ast.AsyncFunctionDef(name=name):
+                names.add(name)
+            case ast.ClassDef(name=name):
+                names.add(name)
+            case ast.alias(name=name, asname=asname):
+                names.add(asname or name.partition(".")[0])
+            case ast.ExceptHandler(name=str(name)):
+                names.add(name)
+            case ast.MatchAs(name=str(name)) | ast.MatchStar(name=str(name)):
+                names.add(name)
+            case ast.Global(names=gnames) | ast.Nonlocal(names=gnames):
+                names.update(gnames)
+    return names
+
+
 def _encapsulate(args, body, context, cont_name):
     assert cont_name not in context.definitions
     context.definitions[cont_name] = ast.FunctionDef(
@@ -51,6 +79,85 @@ def _encapsulate(args, body, context, cont_name):
     return cont_name
 
 
+class _WrapReturns(NodeTransformer):
+    """Pass the values returned in a statement without split points to the continuation.
+
+    The context is a function that builds the value to return from the returned
+    expression (see BodySplitter.returns).
+    """
+
+    def __call__(self, node: ast.Return, context: object):
+        return ast.Return(value=context(node.value or ast.Constant(value=None)))
+
+    def __call__(
+        self,
+        node: ast.FunctionDef | ast.AsyncFunctionDef | ast.Lambda | ast.ClassDef,
+        context: object,
+    ):
+        return node
+
+
+def _jumps(nodes):
+    """Return the kinds of jumps ("break", "continue") in nodes that leave them."""
+    jumps = set()
+    for node in nodes:
+        match node:
+            case ast.Break():
+                jumps.add("break")
+            case ast.Continue():
+                jumps.add("continue")
+            case ast.For() | ast.While():
+                jumps |= _jumps(node.orelse)
+            case ast.FunctionDef() | ast.AsyncFunctionDef() | ast.ClassDef():
+                pass
+            case ast.stmt():
+                for fld in ("body", "orelse", "finalbody", "handlers"):
+                    jumps |= _jumps(getattr(node, fld, []))
+            case ast.excepthandler():
+                jumps |= _jumps(node.body)
+    return jumps
+
+
+def _copy(nodes, context):
+    """Deep copy nodes, along with their entries in the side tables of context."""
+    new = deepcopy(nodes)
+    old_nodes = (n for node in nodes for n in ast.walk(node))
+    new_nodes = (n for node in new for n in ast.walk(node))
+    for old, n in zip(old_nodes, new_nodes):
+        if old in context.tags:
+            context.tags[n] = context.tags[old]
+        if old in context.chainable:
+            context.chainable.add(n)
+    return new
+
+
+def _name(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def _call(func, *args):
+    return ast.Call(func=func, args=list(args), keywords=[])
+
+
+class _Declarations(NodeTransformer):
+    """Remove the global and nonlocal declarations of a scope, collecting them in context."""
+
+    def __call__(self, node: ast.Global, context: dict):
+        context.setdefault(ast.Global, set()).update(node.names)
+        return ast.Pass()
+
+    def __call__(self, node: ast.Nonlocal, context: dict):
+        context.setdefault(ast.Nonlocal, set()).update(node.names)
+        return ast.Pass()
+
+    def __call__(
+        self,
+        node: ast.FunctionDef | ast.AsyncFunctionDef | ast.Lambda | ast.ClassDef,
+        context: dict,
+    ):
+        return node
+
+
 @dataclass
 class BodySplitter:
     queue: deque = field(default_factory=deque)
@@ -58,21 +165,11 @@ class BodySplitter:
     prebody: list = field(default_factory=list)
     continuations: dict[str, ast.AST] = field(default_factory=dict)
 
-    def create_continuation(self, current, context):
-        match current:
-            case ast.Continue():
-                return self.continuations["continue"]
-            case ast.Break():
-                return self.continuations["break"]
+    def create_function(self, param, body, context):
         q = [*self.prebody, *self.queue]
-        if isinstance(current, ast.Assign):
-            name = current.targets[0].id
-        else:
-            name = context.gensym()
         upper_vars = VariableAnalysis.run(
             q, context=Variables(arg_defs=context.variables.arg_defs)
         )
-        body = list(reversed(self.acc))
         acc_vars = VariableAnalysis.run(
             body, context=upper_vars.clone().replace(uses_local=set())
         )
@@ -80,15 +177,30 @@ class BodySplitter:
         to_pass = list(acc_vars.uses_local - new_defs)
         to_pass.sort()
         args = [ast.Name(id=var, ctx=ast.Load()) for var in to_pass]
-        to_pass.append(name)
+        to_pass.append(param)
+
+        func_name = context.strategy.identify(param, q, body, context)
+        func_name = _encapsulate(to_pass, body, context, cont_name=func_name)
+        return func_name, args
+
+    def create_continuation(self, current, context):
+        match current:
+            case ast.Continue():
+                return self.continuations["continue"]
+            case ast.Break():
+                return self.continuations["break"]
+        if isinstance(current, ast.Assign):
+            name = current.targets[0].id
+        else:
+            name = context.gensym()
 
-        if try_model := self.continuations.get("try", None):
-            try_model = deepcopy(try_model)
-            try_model.body = body
-            body = [try_model]
+        body = list(reversed(self.acc))
+        if current is not None:
+            body = [*context.strategy.resume(current.value, name, context), *body]
+        if wrap_try := self.continuations.get("try", None):
+            body = [wrap_try(body)]
 
-        cont_name = context.strategy.identify(name, q, body, context)
-        cont_name = _encapsulate(to_pass, body, context, cont_name=cont_name)
+        cont_name, args = self.create_function(name, body, context)
 
         cont_struct = ast.Call(
             func=ast.Name(id="__FunBite", ctx=ast.Load()),
@@ -96,14 +208,15 @@ class BodySplitter:
             keywords=[],
         )
         if current is not None:
-            return context.strategy.transform(current.value, cont_struct, context)
+            ctx = context.replace(in_try="try" in self.continuations)
+            return context.strategy.transform(current.value, cont_struct, ctx)
         else:
             return context.strategy.default(cont_struct, context)
 
     @ovld
     def process(self, node: ast.If, context: SplitState):
-        node.body = self.subsplit(node.body, context, prebody=self.queue)
-        node.orelse = self.subsplit(node.orelse, context, prebody=self.queue)
+        node.body = self.subsplit(node.body, context, prebody=[*self.prebody, *self.queue])
+        node.orelse = self.subsplit(node.orelse, context, prebody=[*self.prebody, *self.queue])
         self.acc = [node]
 
     @ovld
@@ -116,7 +229,7 @@ class BodySplitter:
         stmt.body = self.subsplit(
             node.body,
             context.replace(continuation=wret),
-            prebody=self.queue,
+            prebody=[*self.prebody, *self.queue],
             continuations={
                 **self.continuations,
                 "continue": wcont,
@@ -125,6 +238,156 @@ class BodySplitter:
         )
         self.acc = [wret]
 
+    @ovld
+    def process(self, node: ast.Try, context: SplitState):
+        if "try" in self.continuations:
+            raise Exception("It is not allowed to nest try/except blocks with split points")
+        tags = context.tags
+        above = [*self.prebody, *self.queue, *node.body]
+        # Continuations for the try body and for the handlers, which leave the try
+        # through the finally block
+        inner = {}
+
+        if node.finalbody:
+            # A helper runs the finally block when the try is left by a return, an
+            # exception, a break or a continue. It receives what to do next: a value
+            # to return, or a __FunBiteThrow to raise.
+            exitsym = context.gensym()
+            check = ast.If(
+                test=ast.Compare(
+                    left=_call(_name("type"), _name(exitsym)),
+                    ops=[ast.Is()],
+                    comparators=[_name("__FunBiteThrow")],
+                ),
+                body=[ast.Raise(exc=ast.Attribute(_name(exitsym), "exception", ast.Load()))],
+                orelse=[],
+            )
+            leave = ast.Return(value=_name(exitsym))
+            leave.no_transform = True
+            # The parameter is bound to a local variable, so that the continuations
+            # of split points in the finally block pass it along
+            param = context.gensym()
+            bind = ast.Assign(
+                targets=[ast.Name(id=exitsym, ctx=ast.Store())], value=_name(param)
+            )
+            helper = BodySplitter(prebody=above, continuations=self.continuations)
+            fbody = helper.split(
+                [bind, *_copy(node.finalbody, context), check, leave],
+                context.replace(continuation=None),
+            )
+            fname, fargs = helper.create_function(param, fbody, context)
+
+            def through_finally(value):
+                return _call(_name("__FunBite"), _name(fname), *fargs, value)
+
+            def throw(excsym):
+                value = through_finally(_call(_name("__FunBiteThrow"), _name(excsym)))
+                return ast.ExceptHandler(
+                    type=_name("BaseException"), name=excsym, body=[ast.Return(value=value)]
+                )
+
+            inner["finally"] = through_finally
+            for kind in _jumps([*node.body, *(h for h in node.handlers)]):
+                jump = ast.Break() if kind == "break" else ast.Continue()
+                tags[jump] = True
+                inner[kind] = self.subcont(
+                    [*_copy(node.finalbody, context), jump], context, prebody=above
+                )
+            after = self.subcont(_copy(node.finalbody, context), context, prebody=above)
+            after = ast.Return(value=after)
+            after.no_transform = True
+        else:
+            after = context.continuation
+
+        # The handlers are hoisted into a single helper function that re-raises the
+        # exception it is given, and every continuation of the try body calls it from
+        # a small stub handler.
+        if node.handlers:
+            hcontext = context.replace(continuation=after)
+            hconts = dict(inner)
+            if node.finalbody:
+                hconts["try"] = lambda body: ast.Try(
+                    body=body, handlers=[throw(context.gensym())], orelse=[], finalbody=[]
+                )
+            for handler in node.handlers:
+                handler.body = self.subsplit(
+                    handler.body, hcontext, prebody=above, continuations=hconts
+                )
+            excsym = context.gensym()
+            raiser = ast.Try(
+                body=[ast.Raise(exc=_name(excsym))],
+                handlers=node.handlers,
+                orelse=[],
+                finalbody=[],
+            )
+            if node.finalbody:
+                raiser = ast.Try(
+                    body=[raiser], handlers=[throw(context.gensym())], orelse=[], finalbody=[]
+                )
+            helper = BodySplitter(prebody=above, continuations=self.continuations)
+            hname, hargs = helper.create_function(excsym, [raiser], context)
+
+        def stub():
+            excsym = context.gensym()
+            if not node.handlers:
+                return throw(excsym)
+            call = _call(_name(hname), *hargs, _name(excsym))
+            return ast.ExceptHandler(
+                type=_name("BaseException"), name=excsym, body=[ast.Return(value=call)]
+            )
+
+        def wrap_try(body):
+            return ast.Try(body=body, handlers=[stub()], orelse=[], finalbody=[])
+
+        if node.orelse:
+            # The else clause runs outside of the try, in its own continuation, but
+            # still before the finally block
+            orelse = node.orelse
+            if node.finalbody:
+                orelse = [
+                    ast.Try(body=orelse, handlers=[], orelse=[], finalbody=node.finalbody)
+                ]
+                tags[orelse[0]] = any(
+                    tags.get(stmt, False) for stmt in (*node.orelse, *node.finalbody)
+                )
+            ret = ast.Return(value=self.subcont(orelse, context, prebody=above))
+            ret.no_transform = True
+        else:
+            ret = after
+        body = self.subsplit(
+            node.body,
+            context.replace(continuation=ret),
+            prebody=[*self.prebody, *self.queue],
+            continuations={**inner, "try": wrap_try},
+        )
+        self.acc = [wrap_try(body)]
+
+    def returns(self, value):
+        """Build the value that a bite returns to return value from the function."""
+        value = ast.Call(func=self.continuations["return"], args=[value], keywords=[])
+        if through_finally := self.continuations.get("finally", None):
+            value = through_finally(value)
+        return value
+
+    def is_tail_call(self, node, focus):
+        if not isinstance(focus, ast.Call) or "try" in self.continuations:
+            return False
+        ret = self.continuations["return"]
+        match node, self.acc:
+            case ast.Return(), _:
+                return True
+            case (
+                ast.Assign(targets=[ast.Name(id=name)]),
+                [
+                    ast.Return(
+                        value=ast.Call(func=func, args=[ast.Name(id=rname)], keywords=[])
+                    )
+                ],
+            ):
+                # x = f(...); return x
+                return func is ret and rname == name
+        return False
+
     def split(self, body, context):
         if context.continuation:
             body = [*body, context.continuation]
@@ -132,7 +395,7 @@ class BodySplitter:
         self.queue = deque(body)
         while self.queue:
             x = self.queue.pop()
-            if not getattr(x, "ignore", True):
+            if context.tags.get(x, False):
                 match x:
                     case ast.Expr(value=focus):
                         pass
@@ -144,12 +407,19 @@ class BodySplitter:
                         focus = x
 
                 if context.strategy.is_split(focus, context):
-                    cont = self.create_continuation(x, context)
+                    if self.is_tail_call(x, focus):
+                        # Hand our own continuation to the callee
+                        cont = context.strategy.transform(
+                            focus, self.continuations["return"], context
+                        )
+                    else:
+                        cont = self.create_continuation(x, context)
                     self.acc = [ast.Return(value=cont)]
 
                 else:
                     cont = self.create_continuation(None, context)
                     ret = ast.Return(value=cont)
+                    ret.no_transform = True
                     ctx = context.replace(continuation=ret)
                     self.process(x, ctx)
 
@@ -157,13 +427,16 @@ class BodySplitter:
                 match x:
                     case ast.Return(value=v):
                         if not getattr(x, "no_transform", False):
-                            x = ast.Return(
-                                value=ast.Call(
-                                    func=self.continuations["return"],
-                                    args=[v],
-                                    keywords=[],
-                                )
-                            )
+                            x = ast.Return(value=self.returns(v or ast.Constant(None)))
+                    case (
+                        ast.If()
+                        | ast.For()
+                        | ast.While()
+                        | ast.With()
+                        | ast.Try()
+                        | ast.Match()
+                    ):
+                        _WrapReturns.run(x, context=self.returns)
                 self.acc.append(x)
 
         return list(reversed(self.acc))
@@ -186,6 +459,11 @@ class BodySplitter:
 
 class Splitter(NodeTransformer):
     def __call__(self, node: ast.FunctionDef, context: SplitState):
+        context.bound = _bound_names([node.args, *node.body])
+        # The declarations apply to all the continuations, wherever they are
+        declarations = {}
+        node.body = _Declarations.run(node.body, context=declarations)
+        node = context.strategy.prepare(node, context)
         node = simplify(node, context=context)
 
         node.args.kwonlyargs.append(ast.arg(arg="continuation", annotation=None))
@@ -193,16 +471,24 @@ class Splitter(NodeTransformer):
 
         context = SplitState(
             name=context.name,
+            count=context.count,
             variables=VariableAnalysis().inner(node, Variables()),
+            tags=context.tags,
+            chainable=context.chainable,
+            bound=context.bound,
             strategy=context.strategy,
             globals=context.globals,
             locals=context.locals,
         )
         conts = {"return": ast.Name(id="continuation", ctx=ast.Load())}
+        has_splits = any(context.tags.get(stmt, False) for stmt in node.body)
         new_body = BodySplitter(prebody=[], continuations=conts).split(node.body, context)
         defns = context.definitions.values()
-        if defns:
+        if has_splits:
             _encapsulate(node.args, new_body, context, cont_name=node.name)
+            decls = [kind(names=sorted(names)) for kind, names in declarations.items()]
+            for defn in defns:
+                defn.body[:0] = deepcopy(decls)
             return [*reversed(defns)]
 
         else:
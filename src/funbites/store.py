@@ -0,0 +1,152 @@
+import hashlib
+import os
+import pickle
+from collections import Counter
+from pathlib import Path
+
+from .runtime import captured
+
+
+def write_atomic(path, data):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, keys):
+        super().__init__(file)
+        self.keys = keys
+
+    def persistent_id(self, obj):
+        return self.keys.get(id(obj), None)
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, store):
+        super().__init__(file)
+        self.store = store
+        self.keys = set()
+
+    def persistent_load(self, key):
+        self.keys.add(key)
+        return self.store.load_object(key)
+
+
+class ObjectStore:
+    """Content-addressed storage for the large values captured in checkpoints.
+
+    ``dump`` pickles a FunBite chain as a skeleton in which every captured value
+    that pickles to at least ``min_size`` bytes is replaced by the hash of its
+    contents, and stores each of these values once in the directory. Values are
+    reference counted with ``retain`` and ``release``, and deleted when they are
+    not referenced anymore.
+
+    The objects declared with ``readonly`` are only pickled and hashed the first
+    time they are seen: later checkpoints reuse the hash of the same object. So are
+    the large strings and bytes that were captured by the previous checkpoint.
+    Other values are pickled at every checkpoint, since they may have been
+    modified in the meantime.
+
+    Captured values are pickled separately, so objects that are shared between
+    two large captured values are duplicated when they are restored.
+
+    Args:
+        directory: The directory to store the values in
+        min_size: Captured values smaller than this are stored in the skeleton
+    """
+
+    def __init__(self, directory, min_size=256):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.min_size = min_size
+        self.refs = Counter()
+        self.known = {}
+        self.strings = {}
+
+    def _path(self, key):
+        return self.directory / key
+
+    def readonly(self, *objects):
+        """Declare objects that will not be modified while they are checkpointed."""
+        for obj in objects:
+            self.known.setdefault(id(obj), (obj, None))
+
+    def _key(self, value, strings):
+        """Return the key of value and its pickle, or None if the key is cached.
+
+        The keys of the strings and bytes that are large enough to be stored are
+        cached in strings.
+        """
+        if (entry := self.strings.get(id(value), None)) is not None and entry[0] is value:
+            strings[id(value)] = entry
+            return entry[1], None
+        if (entry := self.known.get(id(value), None)) is not None and entry[0] is value:
+            if entry[1] is not None:
+                return entry[1], None
+            readonly = True
+        else:
+            readonly = False
+        data = pickle.dumps(value)
+        if len(data) < self.min_size:
+            key = None
+        else:
+            key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if readonly:
+            self.known[id(value)] = (value, key)
+        elif key is not None and type(value) in (str, bytes):
+            strings[id(value)] = (value, key)
+        return key, data
+
+    def dump(self, state, file):
+        """Pickle state into file, storing its large captured values separately.
+
+        Returns:
+            The list of keys of the values state refers to. They should be retained
+            for as long as the skeleton is kept.
+        """
+        keys = {}
+        strings = {}
+        for _, _, value in captured(state):
+            if id(value) in keys:
+                continue
+            key, data = self._key(value, strings)
+            if key is None:
+                continue
+            keys[id(value)] = key
+            path = self._path(key)
+            if not self.refs[key] and not path.exists():
+                write_atomic(path, data if data is not None else pickle.dumps(value))
+        _Pickler(file, keys).dump(state)
+        # Only the strings of the latest checkpoint are kept alive by the cache
+        self.strings = strings
+        return sorted(set(keys.values()))
+
+    def load(self, file):
+        """Load a skeleton pickled by dump.
+
+        Returns:
+            A (state, keys) tuple, where keys are the keys of the values it refers to.
+        """
+        unpickler = _Unpickler(file, self)
+        state = unpickler.load()
+        return state, sorted(unpickler.keys)
+
+    def load_object(self, key):
+        return pickle.loads(self._path(key).read_bytes())
+
+    def retain(self, keys):
+        self.refs.update(keys)
+
+    def release(self, keys):
+        self.refs.subtract(keys)
+        for key in keys:
+            if self.refs[key] <= 0:
+                del self.refs[key]
+                self._path(key).unlink(missing_ok=True)
+
+    def collect(self):
+        """Delete the stored values that are not retained."""
+        for path in self.directory.iterdir():
+            if not path.name.startswith(".") and path.name not in self.refs:
+                path.unlink()
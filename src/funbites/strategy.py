@@ -1,10 +1,13 @@
 import ast
+import builtins
 import hashlib
 import inspect
+import re
 
-from ovld import ovld, recurse
+from ovld import call_next, ovld, recurse
 
-from .runtime import Loop
+from .runtime import FunBite, Loop
+from .visit import NodeDisjunction, NodeTransformer, NodeVisitor
 
 
 def continuator(fn):
@@ -22,17 +25,43 @@ def _hashexpr(node: ast.AST):
     return tuple((f, recurse(x)) for f, x in ast.iter_fields(node))
 
 
+_gensym = re.compile(r"__\d+")
+
+
+@ovld
+def _hashexpr(x: str):
+    # Generated names are numbered in the order they are created, which changes
+    # when split points are added or removed anywhere in the function
+    return _gensym.sub("__", x)
+
+
 @ovld
-def _hashexpr(x: str | int):
+def _hashexpr(x: int):
     return x
 
 
 @ovld
 def _hashexpr(x: object):
-    return hash(x)
+    # hash() is salted per process for bytes and based on the address for None
+    # or Ellipsis, but the identifiers must be the same in every process
+    return (type(x).__name__, repr(x))
 
 
 class Strategy:
+    variant = ""
+
+    def prepare(self, node, context):
+        """Transform the function definition before it is split.
+
+        Args:
+            node: The ast.FunctionDef to split
+            context: The current split context
+
+        Returns:
+            ast.FunctionDef: The function definition to split
+        """
+        return node
+
     def is_split(self, node, context):
         """Determine if the excution should be split at this point.
 
@@ -70,6 +99,19 @@ class Strategy:
         """
         raise NotImplementedError()
 
+    def resume(self, node, var, context):
+        """Generate statements to run when resuming after a boundary node.
+
+        Args:
+            node: An AST node for which is_split is True
+            var: The name of the variable that receives the resumption value
+            context: The current split context
+
+        Returns:
+            list[ast.AST]: Statements to prepend to the continuation's body
+        """
+        return []
+
     def identify(self, name, above, body, context):
         """Generate a unique identifier for a continuation.
 
@@ -100,14 +142,113 @@ def returns(x):
     return x
 
 
+_FORWARD = object()
+_SELF = object()
+
+
+def _lookup(name, context):
+    if name == context.name and context.bound is not None and name not in context.bound:
+        return _SELF
+    elif name in context.locals:
+        return context.locals[name]
+    elif name in context.globals:
+        return context.globals[name]
+    elif context.bound is None or name in context.bound or hasattr(builtins, name):
+        return None
+    else:
+        # Not defined yet: presumably a global that is defined later in the module
+        return _FORWARD
+
+
+_scopes = ast.FunctionDef | ast.AsyncFunctionDef | ast.Lambda | ast.ClassDef
+
+
+class _Yields(NodeDisjunction):
+    """Check whether a scope yields, i.e. whether it is a generator."""
+
+    def __call__(self, node: ast.Yield | ast.YieldFrom, context: object):
+        return True
+
+    def __call__(self, node: _scopes, context: object):
+        return False
+
+
+class _Chainable(NodeVisitor):
+    """Collect the calls that can be split if they are to a function defined later.
+
+    Such calls are only split where they can be hoisted into a statement of their
+    own: in the value of an expression, assignment or return statement, through
+    other calls and operators. Elsewhere, e.g. in conditional expressions,
+    comprehensions, lambdas or with items, they stay plain calls.
+    """
+
+    calls: set = None
+
+    def reduce(self, node, results, context):
+        return None
+
+    def fields(self, node, context):
+        for _, value in ast.iter_fields(node):
+            self(value, context)
+
+    def __call__(self, node: ast.Expr | ast.Return, context: object):
+        recurse(node.value, True)
+
+    def __call__(self, node: ast.Assign, context: object):
+        if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            recurse(node.value, True)
+
+    def __call__(self, node: ast.Call, context: object):
+        if context:
+            self.calls.add(node)
+            self.fields(node, context)
+
+    def __call__(
+        self,
+        node: ast.BinOp | ast.UnaryOp | ast.Attribute | ast.Subscript | ast.Starred,
+        context: object,
+    ):
+        self.fields(node, context)
+
+    def __call__(self, node: ast.Tuple | ast.List | ast.keyword, context: object):
+        self.fields(node, context)
+
+    def __call__(self, node: ast.expr | ast.Match | _scopes, context: object):
+        return None
+
+
 class MainStrategy(Strategy):
+    """Split at continuator calls, continue, break and yield.
+
+    Args:
+        atomic: If True, loops that contain no split points other than their own
+            continue and break statements run natively instead of going through
+            the trampoline at every iteration. They cannot be interrupted midway.
+    """
+
+    def __init__(self, atomic=False):
+        self.atomic = atomic
+
+    @property
+    def variant(self):
+        """Distinguish the continuations of the same code split with other options."""
+        return "atomic" if self.atomic else ""
+
+    def prepare(self, node, context):
+        # Generators cannot pass a continuation to the functions they call
+        if not _Yields.run(node.body, context=context):
+            _Chainable.run(node.body, context=False, calls=context.chainable)
+        if self.atomic:
+            node.body = _Atomic.run(node.body, context=context)
+        return node
+
     def is_split(self, node, context):
         match node:
             case ast.Call(func=ast.Name(x)):
-                ref = (
-                    context.locals[x] if x in context.locals else context.globals.get(x, None)
-                )
-                if getattr(ref, "__is_continuator__", False):
+                ref = _lookup(x, context)
+                if ref is _FORWARD or ref is _SELF:
+                    return node in context.chainable
+                elif getattr(ref, "__is_continuator__", False):
                     return True
             case ast.Continue():
                 return True
@@ -120,18 +261,58 @@ class MainStrategy(Strategy):
     def transform(self, node, cont, context):
         match node:
             case ast.Call(func, args, keywords):
+                ref = _lookup(func.id, context)
+                helper = "__FunBite"
+                if ref is _FORWARD:
+                    # Whether it is a continuator is only known when it is called
+                    args = [func, *args]
+                    func = ast.Name(id="__FunCall", ctx=ast.Load())
+                elif hasattr(ref, "__passthrough__") and not context.in_try:
+                    # The continuation may run inline, which would put it in the
+                    # scope of the exception handlers in a try
+                    helper = "__FunPass"
                 return ast.Call(
-                    func=ast.Name(id="__FunBite", ctx=ast.Load()),
+                    func=ast.Name(id=helper, ctx=ast.Load()),
                     args=[func, *args],
                     keywords=[*keywords, ast.keyword("continuation", cont)],
                 )
             case ast.Yield(value):
                 return ast.Call(
                     func=ast.Name(id="__FunBiteYield", ctx=ast.Load()),
-                    args=[value],
-                    keywords=[ast.keyword("continuation", cont)],
+                    args=[value or ast.Constant(None), *cont.args],
+                    keywords=cont.keywords,
                 )
 
+    def resume(self, node, var, context):
+        match node:
+            case ast.Yield():
+                # if type(var) is __FunBiteThrow: raise var.exception
+                return [
+                    ast.If(
+                        test=ast.Compare(
+                            left=ast.Call(
+                                func=ast.Name(id="type", ctx=ast.Load()),
+                                args=[ast.Name(id=var, ctx=ast.Load())],
+                                keywords=[],
+                            ),
+                            ops=[ast.Is()],
+                            comparators=[ast.Name(id="__FunBiteThrow", ctx=ast.Load())],
+                        ),
+                        body=[
+                            ast.Raise(
+                                exc=ast.Attribute(
+                                    value=ast.Name(id=var, ctx=ast.Load()),
+                                    attr="exception",
+                                    ctx=ast.Load(),
+                                )
+                            )
+                        ],
+                        orelse=[],
+                    )
+                ]
+            case _:
+                return []
+
     def default(self, cont, context):
         return ast.Call(
             func=cont.func,
@@ -139,23 +320,184 @@ class MainStrategy(Strategy):
             keywords=cont.keywords,
         )
 
-    def identify(self, above, body, name, context):
-        hsh = hashlib.blake2b(
-            str(_hashexpr([name, *above])).encode(), digest_size=8
-        ).hexdigest()
-        return f"{context.name}__{hsh}"
+    def identify(self, name, above, body, context):
+        # The identifier only depends on the code above the split point, so that it
+        # survives changes to the code below. The body disambiguates continuations
+        # that are created at the same point.
+        for parts in ([self.variant, name, *above], [self.variant, name, *above, *body]):
+            hsh = hashlib.blake2b(str(_hashexpr(parts)).encode(), digest_size=8).hexdigest()
+            ident = f"{context.name}__{hsh}"
+            if ident not in context.definitions:
+                return ident
+        i = 1
+        while f"{ident}_{i}" in context.definitions:
+            i += 1
+        return f"{ident}_{i}"
 
     def wrap(self, entry, original):
         is_generator = inspect.isgeneratorfunction(original)
         is_async = inspect.iscoroutinefunction(original)
+        # Pickle the entry point by reference through the wrapper, as <name>.entry
+        entry.__qualname__ = f"{original.__qualname__}.entry"
         return Fun(entry, is_generator=is_generator, is_async=is_async)
 
 
+class _HasSplit(NodeDisjunction):
+    """Check for split points, other than continue and break, in a single scope."""
+
+    def __call__(self, node: ast.AST, context: object):
+        return context.strategy.is_split(node, context) or call_next(node, context)
+
+    def __call__(self, node: ast.Continue | ast.Break | _scopes, context: object):
+        return False
+
+
+class _Native(NodeVisitor):
+    """Tag continue and break statements as not being split points."""
+
+    def reduce(self, node, results, context):
+        return None
+
+    def __call__(self, node: ast.Continue | ast.Break, context: object):
+        context.tags[node] = False
+
+    def __call__(self, node: _scopes, context: object):
+        return None
+
+
+class _Atomic(NodeTransformer):
+    """Run the loops without split points natively."""
+
+    def __call__(self, node: ast.For | ast.While, context: object):
+        if _HasSplit.run(node, context=context):
+            return call_next(node, context)
+        _Native.run(node.body, context=context)
+        return node
+
+    def __call__(self, node: _scopes, context: object):
+        return node
+
+
+_CHUNK_TEMPLATE = """
+while True:
+    {t} = 0
+    while ({t} := {t} + 1) <= {every} and ({ok} := TEST):
+        pass
+    if {t} > {every}:
+        continue
+    if not {ok}:
+        pass
+    break
+"""
+
+
+class _BackEdges(NodeTransformer):
+    """Run the loops without split points in chunks of a fixed number of iterations.
+
+    Each chunk is a native inner loop, and the outer loop splits between chunks::
+
+        while True:
+            t = 0
+            while (t := t + 1) <= every and (ok := <test>):
+                <body>
+            if t > every:
+                continue  # end of the chunk: split here
+            if not ok:
+                <orelse>
+            break
+    """
+
+    every: int = 1
+
+    def __call__(self, node: ast.For | ast.While, context: object):
+        if _HasSplit.run(node, context=context):
+            return call_next(node, context)
+
+        _Native.run(node.body, context=context)
+        pre = []
+        body = node.body
+        match node:
+            case ast.For(target, iterable):
+                it = context.gensym()
+                x = context.gensym()
+                pre = [
+                    ast.Assign(
+                        targets=[ast.Name(id=it, ctx=ast.Store())],
+                        value=ast.Call(
+                            func=ast.Name(id="iter", ctx=ast.Load()),
+                            args=[iterable],
+                            keywords=[],
+                        ),
+                    )
+                ]
+                test = ast.parse(
+                    f"({x} := next({it}, StopIteration)) is not StopIteration", mode="eval"
+                ).body
+                body = [
+                    ast.Assign(targets=[target], value=ast.Name(id=x, ctx=ast.Load())),
+                    *body,
+                ]
+            case ast.While(test):
+                # Only keep a boolean in ok, so that the test's value is not captured
+                test = ast.Call(
+                    func=ast.Name(id="bool", ctx=ast.Load()), args=[test], keywords=[]
+                )
+
+        template = _CHUNK_TEMPLATE.format(
+            t=context.gensym(), ok=context.gensym(), every=self.every
+        )
+        (outer,) = ast.parse(template).body
+        _, inner, _, exhausted, _ = outer.body
+        inner.test.values[1].value = test
+        inner.body = body
+        if node.orelse:
+            exhausted.body = node.orelse
+        else:
+            outer.body.remove(exhausted)
+        return [*pre, outer]
+
+    def __call__(self, node: _scopes, context: object):
+        return node
+
+
+class LoopStrategy(MainStrategy):
+    """Also split at loop back-edges.
+
+    Plain loops become resumable without being modified, so that checkpoints and
+    preemption can happen between iterations. Loops that already contain split
+    points are left as they are, since they already go through the trampoline at
+    every iteration.
+
+    Args:
+        every: Only split every this many iterations. The iterations in between run
+            natively, without going through the trampoline.
+    """
+
+    def __init__(self, every=1):
+        if every < 1:
+            raise ValueError(f"every must be at least 1, not {every}")
+        super().__init__()
+        self.every = every
+
+    @property
+    def variant(self):
+        return f"loops:{self.every}"
+
+    def prepare(self, node, context):
+        node = super().prepare(node, context)
+        node.body = _BackEdges.run(node.body, context=context, every=self.every)
+        return node
+
+
 class Fun:
-    def __init__(self, entry, is_generator=False, is_async=False):
+    def __init__(self, entry, is_generator=False, is_async=False, buffer=None):
         self.entry = entry
         self.is_generator = is_generator
         self.is_async = is_async
+        self.buffer = buffer
+        # Calls from other split functions are chained through the continuation
+        # rather than run in a nested trampoline
+        self.__is_continuator__ = not is_generator and not is_async
 
     def __call__(self, *args, continuation=None, **kwargs):
         if continuation is not None:
@@ -168,6 +510,7 @@ class Fun:
             args,
             {"continuation": returns, **kwargs},
             is_generator=self.is_generator,
+            buffer=self.buffer,
         )
 
         if self.is_generator:
@@ -176,3 +519,14 @@ class Fun:
             raise NotImplementedError()
         else:
             return loop.run()
+
+    def run_for(self, timeslice, *args, **kwargs):
+        """Call the function, but stop after at most timeslice seconds.
+
+        Returns:
+            The result, or the pending FunBite if the time slice ran out. Call its
+            run_for method to resume it.
+        """
+        if not self.__is_continuator__:
+            raise TypeError("Only checkpointable functions can be preempted")
+        return FunBite(self.entry, *args, continuation=returns, **kwargs).run_for(timeslice)
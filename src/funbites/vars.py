@@ -118,7 +118,10 @@ class VariableAnalysis(NodeVisitor):
         return context
 
     def __call__(self, node: ast.excepthandler, context: Variables):
-        context.define(node.name)
+        recurse(node.type, context)
+        if node.name is not None:
+            context.define(node.name)
+        recurse(node.body, context)
         return context
 
     def reduce(self, node, results, context):
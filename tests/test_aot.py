@@ -0,0 +1,98 @@
+import importlib
+import sys
+import textwrap
+
+import pytest
+
+from funbites import aot, interface
+from funbites.registry import continuations
+
+SOURCE = textwrap.dedent("""
+    from funbites.checkpoint import checkpoint
+    from funbites.interface import checkpointable, resumable
+    from funbites.strategy import LoopStrategy
+
+    OFFSET = 1
+
+
+    @checkpointable
+    def job(n, offset=OFFSET):
+        total = 0
+        for i in range(n):
+            total += i
+            checkpoint()
+        return total + offset
+
+
+    @checkpointable(strategy=LoopStrategy(every=4))
+    def looping(n):
+        total = 0
+        for i in range(n):
+            total += i
+        return total
+
+
+    @resumable
+    def count(n):
+        for i in range(n):
+            yield i
+
+
+    def plain(n):
+        return job(n) + 1
+""")
+
+
+@pytest.fixture
+def aot_module(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "aot_mod.py").write_text(SOURCE)
+    monkeypatch.syspath_prepend(src)
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    sys.modules.pop("aot_mod", None)
+    yield tmp_path
+    sys.modules.pop("aot_mod", None)
+
+
+def _keys():
+    return {k for k in continuations if k.startswith("aot_mod:")}
+
+
+def test_generate(aot_module):
+    mod, recorded = aot.record("aot_mod")
+    assert [fn.__name__ for fn, *_ in recorded] == ["job", "looping", "count"]
+    code = aot.generate(mod, recorded)
+    assert code.startswith("# Generated by funbites.aot from aot_mod.py")
+    assert "__funbites_splits__['job'] = ('MainStrategy:', ('job', 'job__" in code
+    assert "__funbites_splits__['looping'] = ('LoopStrategy:loops:4'," in code
+    compile(code, "aot_mod.py", "exec")
+
+
+def test_import_generated(aot_module, monkeypatch):
+    out = aot_module / "out"
+    aot.main(["aot_mod", "-o", str(out), "--compile"])
+    keys = _keys()
+    sys.modules.pop("aot_mod")
+    assert (out / "aot_mod.py").exists()
+    assert list((out / "__pycache__").glob("aot_mod.*.pyc"))
+
+    def fail(*args):
+        raise AssertionError("The module should not be split again")
+
+    monkeypatch.setattr(interface, "_split_tree", fail)
+    monkeypatch.syspath_prepend(out)
+    importlib.invalidate_caches()
+    mod = importlib.import_module("aot_mod")
+    assert mod.__file__ == str(out / "aot_mod.py")
+    assert mod.job(10) == 46
+    assert mod.looping(10) == 45
+    assert list(mod.count(3)) == [0, 1, 2]
+    assert mod.plain(10) == 47
+    assert _keys() == keys
+
+
+def test_already_imported(aot_module):
+    importlib.import_module("aot_mod")
+    with pytest.raises(Exception, match="already imported"):
+        aot.record("aot_mod")
@@ -0,0 +1,70 @@
+import pytest
+
+from funbites.batch import Batch, run_batch
+from funbites.checkpoint import Checkpointer, checkpoint
+from funbites.interface import checkpointable, resumable
+from funbites.runtime import no_inline
+
+_log = []
+_fail = set()
+
+
+@checkpointable
+def triangle(n, offset=0):
+    total = offset
+    for i in range(n):
+        _log.append((n, i))
+        if (n, i) in _fail:
+            raise ValueError(n)
+        total += i
+        checkpoint()
+    return total
+
+
+@resumable
+def count(n):
+    for i in range(n):
+        yield i
+
+
+def test_batch():
+    assert run_batch(triangle, range(10)) == [sum(range(n)) for n in range(10)]
+    assert run_batch(triangle, [3, 4], [100, 200]) == [103, 206]
+
+
+def test_lockstep():
+    _log.clear()
+    batch = Batch.start(triangle, [3, 3, 3], window=2)
+    with no_inline():
+        while not batch.step():
+            pass
+    assert batch.states == [3, 3, 3]
+    # The first two instances run side by side, the third once one of them is done
+    assert _log[:4] == [(3, 0), (3, 0), (3, 1), (3, 1)]
+    assert len(_log) == 9
+
+
+def test_batch_checkpoint(tmp_path):
+    path = tmp_path / "batch.pkl"
+    _log.clear()
+    _fail.add((5, 3))
+    try:
+        with pytest.raises(ValueError):
+            Checkpointer(path).run(run_batch, triangle, range(6))
+    finally:
+        _fail.clear()
+    assert path.exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["batch.pkl", "batch.pkl.manifest"]
+    ran = len(_log)
+
+    _log.clear()
+    chk = Checkpointer(path, cleanup=True)
+    assert chk.run(run_batch, triangle, range(6)) == [sum(range(n)) for n in range(6)]
+    # The batch resumes from its last checkpoint rather than from the start
+    assert len(_log) + ran < 2 * sum(range(6))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_not_checkpointable():
+    with pytest.raises(TypeError):
+        run_batch(count, [1, 2])
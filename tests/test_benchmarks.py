@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.run import report, run_checkpointed
+from benchmarks.workloads import WORKLOADS, make_text, make_tree
+
+SMALL_INPUTS = {
+    "numeric": 50,
+    "nested_break": 20,
+    "tokenizer": make_text(1)[:200],
+    "tree_walk": make_tree(4),
+}
+
+
+@pytest.mark.parametrize("workload", WORKLOADS, ids=lambda w: w.name)
+def test_forms_agree(workload):
+    arg = SMALL_INPUTS[workload.name]
+    expected = workload.forms["plain"](arg)
+    for form, func in workload.forms.items():
+        assert func(arg) == expected, form
+
+
+@pytest.mark.parametrize("workload", WORKLOADS, ids=lambda w: w.name)
+def test_checkpointed(workload, tmp_path):
+    arg = SMALL_INPUTS[workload.name]
+    seconds, written = run_checkpointed(workload.forms["checkpointable"], arg, tmp_path)
+    assert written > 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_report(capsys):
+    results = [
+        {"workload": "w", "form": "plain", "throughput": 100.0, "peak_memory": 2048},
+        {
+            "workload": "w",
+            "form": "checkpointed",
+            "throughput": 10.0,
+            "checkpoint_bytes_per_sec": 5e6,
+        },
+    ]
+    baseline = {"results": [{"workload": "w", "form": "plain", "throughput": 50.0}]}
+    report(results, baseline)
+    out = capsys.readouterr().out
+    assert "10.0x" in out
+    assert "+100%" in out
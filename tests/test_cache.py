@@ -0,0 +1,87 @@
+import textwrap
+
+import pytest
+
+from funbites import cache
+from funbites.cache import SplitCache, fingerprint
+from funbites.registry import continuations
+from funbites.strategy import LoopStrategy, MainStrategy
+
+SOURCE = textwrap.dedent("""
+    from funbites.checkpoint import checkpoint
+    from funbites.interface import checkpointable
+
+    @checkpointable
+    def job(n):
+        total = 0
+        for i in range(n):
+            total += i
+            checkpoint()
+        return total
+
+    @checkpointable
+    def plain(n):
+        return n + 1
+""")
+
+
+def _load(filename, name):
+    glb = {"__name__": name}
+    exec(compile(SOURCE, str(filename), "exec"), glb)
+    return glb
+
+
+@pytest.fixture
+def split_cache(tmp_path, monkeypatch):
+    split_cache = SplitCache(tmp_path / "cache")
+    monkeypatch.setattr(cache, "split_cache", split_cache)
+    return split_cache
+
+
+def test_populate(tmp_path, split_cache):
+    path = tmp_path / "cached_mod.py"
+    path.write_text(SOURCE)
+    with pytest.warns(UserWarning, match="No split points"):
+        glb = _load(path, "cached_mod")
+    assert glb["job"](10) == 45
+    # One entry for job, and one recording that plain has no split points
+    assert len(list(split_cache.directory.iterdir())) == 2
+
+
+def test_without_source(tmp_path, split_cache):
+    path = tmp_path / "cached_mod.py"
+    path.write_text(SOURCE)
+    with pytest.warns(UserWarning):
+        _load(path, "cached_mod")
+    with pytest.warns(UserWarning, match="No split points"):
+        glb = _load("<nosource>", "nosource_mod")
+    assert glb["job"](10) == 45
+    assert glb["job"].entry.__code__.co_filename == "<nosource>"
+    assert any(key.startswith("nosource_mod:job__") for key in continuations)
+
+
+def test_without_source_not_cached(split_cache):
+    with pytest.raises(OSError, match="not in the split cache"):
+        _load("<nosource>", "nosource_mod")
+
+
+def test_readonly(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "split_cache", SplitCache(tmp_path / "cache", readonly=True))
+    path = tmp_path / "cached_mod.py"
+    path.write_text(SOURCE)
+    with pytest.warns(UserWarning):
+        _load(path, "cached_mod")
+    assert not (tmp_path / "cache").exists()
+
+
+def test_fingerprint():
+    def f(x):
+        return x
+
+    def g(x):
+        return x + 1
+
+    assert fingerprint(f, MainStrategy()) == fingerprint(f, MainStrategy())
+    assert fingerprint(f, MainStrategy()) != fingerprint(g, MainStrategy())
+    assert fingerprint(f, MainStrategy()) != fingerprint(f, MainStrategy(atomic=True))
+    assert fingerprint(f, LoopStrategy(every=2)) != fingerprint(f, LoopStrategy(every=3))
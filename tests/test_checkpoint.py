@@ -1,8 +1,20 @@
+import contextlib
+import importlib
+import json
 import pickle
+import sys
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from funbites.checkpoint import Checkpointer, checkpoint
+import pytest
+
+from funbites import runtime
+from funbites.checkpoint import Checkpointer, SharedCheckpointer, checkpoint
 from funbites.interface import checkpointable, resumable
-from funbites.strategy import continuator
+from funbites.runtime import FunBite
+from funbites.strategy import continuator, returns
 
 
 class Stop(Exception):
@@ -77,3 +89,398 @@ def test_serialize_generator():
     sq = pickle.loads(ser)
     assert next(sq) == 9
     assert next(sq) == 16
+
+
+@resumable(buffer=3)
+def buffered_squares():
+    i = 0
+    while True:
+        yield i * i
+        i += 1
+
+
+def test_serialize_buffered_generator():
+    sq = buffered_squares()
+    assert next(sq) == 0
+    ser = pickle.dumps(sq)
+    assert next(sq) == 1
+    assert next(sq) == 4
+    assert next(sq) == 9
+    sq = pickle.loads(ser)
+    assert list(sq.buffer) == [1, 4]
+    assert next(sq) == 1
+    assert next(sq) == 4
+    assert next(sq) == 9
+
+
+@checkpointable
+def accumulate(n):
+    items = []
+    for i in range(n):
+        items.append(str(i) * 100)
+        checkpoint()
+    return len(items)
+
+
+@checkpointable
+def accumulate_twice(n):
+    a = accumulate(n)
+    b = accumulate(n)
+    return a + b
+
+
+def test_measure(tmp_path):
+    chk = Checkpointer(tmp_path / "data.pkl", measure=True)
+    assert chk.run(accumulate_twice, 3) == 6
+    assert len(chk.records) == 6
+    assert all(r.size > 0 for r in chk.records)
+    hist = chk.histogram()
+    items = hist["accumulate.items"]
+    assert len(items) == 6
+    assert items[0] < items[1] < items[2]
+    assert items[3] < items[2]
+    assert "accumulate_twice.n" in hist
+    # The caller's continuation is accounted for through its own variables
+    assert "accumulate.continuation" not in hist
+    assert hist["accumulate_twice.a"] == [0, 0, 0, 5, 5, 5]
+
+
+def test_no_measure(tmp_path):
+    chk = Checkpointer(tmp_path / "data.pkl")
+    chk.run(accumulate, 3)
+    assert chk.records == []
+
+
+def test_preemption():
+    state = accumulate.run_for(0, 10)
+    preemptions = 1
+    while isinstance(state, FunBite):
+        # The pending state can be checkpointed between time slices
+        state = pickle.loads(pickle.dumps(state)).run_for(0)
+        preemptions += 1
+    assert state == 10
+    assert preemptions > 10
+
+
+def test_preemption_long_slice():
+    assert accumulate.run_for(60, 10) == 10
+
+
+def test_preemption_generator():
+    with pytest.raises(TypeError):
+        counting_gen.run_for(60)
+
+
+@resumable
+def counting_gen():
+    yield 1
+
+
+@checkpointable
+def calls_later(n):
+    return defined_later(n) + n
+
+
+@checkpointable
+def later_in_finally(n, log):
+    try:
+        checkpoint()
+        if n > 2:
+            return n
+    finally:
+        # The finally block is copied for each way out of the try
+        log.append(defined_later(n))
+    return 0
+
+
+@checkpointable
+def defined_later(n):
+    total = 0
+    for i in range(n):
+        total += i
+        checkpoint()
+    return total
+
+
+@checkpointable
+def calls_plain_later(n):
+    checkpoint()
+    return plain_later(n) + 1
+
+
+def plain_later(n):
+    return n * 2
+
+
+# Forward references where the call cannot be hoisted out of its expression: they
+# stay plain calls
+
+
+@checkpointable
+def later_in_comprehension(n):
+    checkpoint()
+    return sum([twice_later(i) for i in range(n)])
+
+
+@checkpointable
+def later_in_boolop(n):
+    checkpoint()
+    return n and twice_later(n)
+
+
+@checkpointable
+def later_in_with(n):
+    checkpoint()
+    with contextlib.nullcontext(twice_later(n)) as x:
+        checkpoint()
+        return x
+
+
+@checkpointable
+def later_in_ifexp(n):
+    checkpoint()
+    return twice_later(n) if n else 0
+
+
+@checkpointable
+def later_in_lambda(n):
+    checkpoint()
+    return (lambda: twice_later(n))()
+
+
+@checkpointable
+def later_in_def(n):
+    def inner():
+        return twice_later(n)
+
+    checkpoint()
+    return inner()
+
+
+def twice_later(n):
+    return n * 2
+
+
+def test_forward_reference_is_chained(tmp_path):
+    chk = Checkpointer(tmp_path / "data.pkl", measure=True)
+    assert chk.run(calls_later, 3) == 6
+    # The caller's frame is captured in the callee's checkpoints
+    assert "calls_later.n" in chk.histogram()
+
+
+def test_forward_reference_in_finally(tmp_path):
+    log = []
+    assert Checkpointer(tmp_path / "a.pkl", measure=True).run(later_in_finally, 3, log) == 3
+    assert Checkpointer(tmp_path / "b.pkl", measure=True).run(later_in_finally, 2, log) == 0
+    assert log == [3, 1]
+
+
+def test_forward_reference_to_plain_function():
+    assert calls_plain_later(3) == 7
+
+
+@pytest.mark.parametrize(
+    "func, expected",
+    [
+        (later_in_comprehension, 12),
+        (later_in_boolop, 8),
+        (later_in_with, 8),
+        (later_in_ifexp, 8),
+        (later_in_lambda, 8),
+        (later_in_def, 8),
+    ],
+)
+def test_forward_reference_in_expression(func, expected):
+    assert func(4) == expected
+
+
+crash = {"at": None, "ran": []}
+
+
+@checkpointable
+def crashy(n):
+    items = []
+    for i in range(n):
+        crash["ran"].append(i)
+        items.append(i)
+        checkpoint()
+        if i == crash["at"]:
+            # Mutations after the checkpoint must not leak into it
+            items.append(1000)
+            raise Stop()
+    return sum(items)
+
+
+def test_shared_checkpointer(tmp_path, monkeypatch):
+    def work(key):
+        try:
+            return shared.run(key, crashy, 10 + key)
+        except Stop:
+            return "stopped"
+
+    def slow_write(path, data):
+        time.sleep(0.01)
+        write_file(path, data)
+
+    with SharedCheckpointer(tmp_path) as shared:
+        write_file = shared._write_file
+        monkeypatch.setattr(shared, "_write_file", slow_write)
+        with ThreadPoolExecutor(4) as pool:
+            monkeypatch.setitem(crash, "at", 5)
+            assert list(pool.map(work, range(8))) == ["stopped"] * 8
+            monkeypatch.setitem(crash, "at", None)
+            monkeypatch.setitem(crash, "ran", [])
+            results = list(pool.map(work, range(8)))
+    assert results == [sum(range(10 + k)) for k in range(8)]
+    # The tasks resumed after the iteration they crashed in, even though their
+    # last checkpoints were still being written
+    assert min(crash["ran"]) == 6
+    for k in range(8):
+        with (tmp_path / f"{k}.pkl").open("rb") as f:
+            assert pickle.load(f).execute() == results[k]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{k}.pkl" for k in range(8)]
+
+
+def test_shared_checkpointer_cleanup(tmp_path):
+    with SharedCheckpointer(tmp_path, cleanup=True) as shared:
+        assert shared.run("a", crashy, 10) == 45
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shared_checkpointer_no_dedup(tmp_path):
+    with pytest.raises(TypeError, match="dedup"):
+        SharedCheckpointer(tmp_path, dedup=True)
+
+
+def test_shared_checkpointer_flush_racing_close(tmp_path, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocked_write(path, data):
+        started.set()
+        release.wait()
+        write_file(path, data)
+
+    shared = SharedCheckpointer(tmp_path)
+    write_file = shared._write_file
+    monkeypatch.setattr(shared, "_write_file", blocked_write)
+    shared.queue.put((tmp_path / "a.pkl", b"data"))
+    started.wait()
+    # A flush that gets queued behind the stop signal
+    shared.queue.put(None)
+    event = threading.Event()
+    shared.queue.put(event)
+    release.set()
+    assert event.wait(5)
+    shared.close()
+    assert (tmp_path / "a.pkl").read_bytes() == b"data"
+
+
+DRIFT_ABOVE = """
+from funbites.checkpoint import checkpoint
+from funbites.interface import checkpointable
+
+@checkpointable
+def job(n):
+    x = n + 1
+    y = n * 2
+    checkpoint()
+"""
+
+
+def _drift_module(tmp_path, below):
+    (tmp_path / "drifting_mod.py").write_text(
+        DRIFT_ABOVE + textwrap.indent(textwrap.dedent(below), "    ")
+    )
+    sys.modules.pop("drifting_mod", None)
+    importlib.invalidate_caches()
+    return importlib.import_module("drifting_mod")
+
+
+@pytest.fixture
+def drift(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(tmp_path)
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    mod = _drift_module(tmp_path, "if x + y:\n    raise Stop()\nreturn x + y\n")
+    mod.Stop = Stop
+    chk = Checkpointer(tmp_path / "job.pkl")
+    with pytest.raises(Stop):
+        chk.run(mod.job, 10)
+    yield tmp_path, chk
+    sys.modules.pop("drifting_mod", None)
+
+
+def test_manifest(drift):
+    tmp_path, chk = drift
+    entries = json.loads(chk.manifest_file.read_text())["continuations"]
+    (key,) = entries
+    assert key.startswith("drifting_mod:job__")
+    assert entries[key]["params"][1:3] == ["x", "y"]
+
+
+def test_resume_after_drift(drift):
+    tmp_path, chk = drift
+    # The code below the split point changed and does not need x anymore
+    mod = _drift_module(tmp_path, "return y * 100\n")
+    assert chk.run(mod.job, 10) == 2000
+    assert not chk.manifest_file.exists()
+
+
+def test_resume_after_drift_missing_variable(drift):
+    tmp_path, chk = drift
+    mod = _drift_module(tmp_path, "return n + y\n")
+    with pytest.raises(LookupError, match=r"needs variables \['n'\]"):
+        chk.run(mod.job, 10)
+
+
+@checkpointable
+def straight(n):
+    n += 1
+    checkpoint()
+    n *= 2
+    checkpoint()
+    n -= 3
+    checkpoint()
+    return n
+
+
+def test_passthrough(tmp_path):
+    # Without a Checkpointer, the continuations run inline
+    assert straight.entry(1, continuation=returns) == 1
+    with Checkpointer(tmp_path / "straight.pkl"):
+        state = straight.entry(1, continuation=returns)
+        assert isinstance(state, FunBite)
+        assert state.execute() == 1
+    with runtime.no_inline():
+        assert isinstance(straight.entry(1, continuation=returns), FunBite)
+
+
+def test_passthrough_depth(monkeypatch):
+    monkeypatch.setattr(runtime, "INLINE_DEPTH", 2)
+    state = straight.entry(1, continuation=returns)
+    assert isinstance(state, FunBite)
+    assert state.execute() == 1
+
+
+handled = []
+
+
+@checkpointable
+def reraises(n):
+    try:
+        checkpoint()
+        if n > 1:
+            raise ValueError("in the try")
+    except ValueError:
+        handled.append(n)
+        raise
+    return n
+
+
+def test_passthrough_not_in_try():
+    handled.clear()
+    assert reraises(0) == 0
+    with pytest.raises(ValueError, match="in the try"):
+        reraises(5)
+    # Running the continuation inline would run the handler twice
+    assert handled == [5]
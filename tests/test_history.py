@@ -0,0 +1,80 @@
+import pytest
+
+from funbites.checkpoint import Checkpointer, checkpoint
+from funbites.history import History
+from funbites.interface import checkpointable
+from funbites.runtime import FunBite
+from funbites.strategy import returns
+
+
+@checkpointable
+def lookup_sum(table, keys):
+    total = 0
+    for k in keys:
+        total += table[k]
+        checkpoint()
+    return total
+
+
+def _total(xs, y):
+    return sum(xs) + y
+
+
+def test_history_ring(tmp_path):
+    hist = History(tmp_path, size=3, min_size=10)
+    table = list(range(1000))
+    for i in range(10):
+        hist.append(FunBite(_total, table, i))
+    assert hist.steps() == [7, 8, 9]
+    assert len(list(tmp_path.glob("*.ckpt"))) == 3
+    # The table is only stored once
+    assert len(list((tmp_path / "objects").iterdir())) == 1
+    state = hist.load(8)
+    assert state.args == (table, 8)
+
+
+def test_history_reopen(tmp_path):
+    hist = History(tmp_path, size=3, min_size=10)
+    for i in range(5):
+        hist.append(FunBite(_total, [i] * 100, i))
+    hist = History(tmp_path, size=3, min_size=10)
+    assert hist.steps() == [2, 3, 4]
+    hist.drop(2)
+    assert len(list((tmp_path / "objects").iterdir())) == 2
+    assert hist.load(3).execute() == 303
+
+
+def test_rollback(tmp_path):
+    table = {k: k * 10 for k in range(100)}
+    chk = Checkpointer(tmp_path / "data.pkl", history=4)
+    assert chk.run(lookup_sum, table, list(range(10))) == 450
+    assert chk.history.steps() == [6, 7, 8, 9]
+
+    state = chk.rollback(2)
+    assert chk.history.steps() == [6, 7]
+    assert state.execute() == 450
+    # The rolled back checkpoint is now the current one
+    assert chk.restore().execute() == 450
+
+    with pytest.raises(IndexError):
+        chk.rollback(2)
+
+
+def test_rollback_without_history(tmp_path):
+    chk = Checkpointer(tmp_path / "data.pkl")
+    with pytest.raises(TypeError):
+        chk.rollback()
+
+
+def test_history_cleanup(tmp_path):
+    chk = Checkpointer(tmp_path / "data.pkl", history=4, cleanup=True)
+    assert chk.run(lookup_sum, {1: 2}, [1, 1]) == 4
+    assert chk.history.steps() == []
+    assert not (tmp_path / "data.pkl").exists()
+
+
+def test_history_restart(tmp_path):
+    chk = Checkpointer(tmp_path / "data.pkl", history=2)
+    state = lookup_sum({1: 2}, [1, 1], continuation=returns)
+    chk.history.append(state)
+    assert Checkpointer(tmp_path / "data.pkl", history=2).history.steps() == [0]
@@ -0,0 +1,66 @@
+from funbites.checkpoint import checkpoint
+from funbites.interface import checkpointable, resumable
+from funbites.memory import chain_memory, format_chain_memory
+from funbites.runtime import FunBite, no_inline
+from funbites.strategy import returns
+
+
+@resumable
+def padded(data):
+    padding = "x" * 10_000
+    for x in data:
+        yield x + len(padding)
+
+
+def test_generator_chain():
+    gen = padded([1, 2, 3])
+    assert next(gen) == 10_001
+    (report,) = chain_memory(gen)
+    assert report.kind == "FunBiteYield"
+    assert report.func.startswith(f"{__name__}:padded__")
+    sizes = {arg.name: arg.size for arg in report.arguments}
+    assert sizes["padding"] > 10_000
+    assert report.size >= sum(sizes.values())
+    assert report.unused == []
+
+
+@checkpointable
+def outer(xs):
+    total = inner(xs)
+    checkpoint()
+    return total + len(xs)
+
+
+@checkpointable
+def inner(xs):
+    checkpoint()
+    return sum(xs)
+
+
+def test_nested_chain():
+    xs = list(range(1000))
+    with no_inline():
+        state = outer.entry(xs, continuation=returns)
+        while not (reports := chain_memory(state))[0].func.startswith(f"{__name__}:inner__"):
+            state = state.step()
+    funcs = [r.func.partition(":")[2].partition("__")[0] for r in reports]
+    assert funcs == ["inner", "outer"]
+    # xs is shared by both continuations, and only counted for the first one
+    (inner_xs,) = [a for a in reports[0].arguments if a.name == "xs"]
+    (outer_xs,) = [a for a in reports[1].arguments if a.name == "xs"]
+    assert inner_xs.size > 8000
+    assert outer_xs.size == 0
+
+
+def test_unused_argument():
+    def resume(unused, x):
+        return x
+
+    state = FunBite(resume, list(range(1000)), 1)
+    (report,) = chain_memory(state)
+    assert [arg.name for arg in report.unused] == ["unused"]
+    assert "unused: list  UNUSED" in format_chain_memory([report])
+
+
+def test_not_running():
+    assert chain_memory(1) == []
@@ -0,0 +1,65 @@
+import pickle
+
+from funbites import pipeline as P
+from funbites.interface import resumable
+
+
+@resumable
+def naturals():
+    i = 0
+    while True:
+        yield i
+        i += 1
+
+
+def square(x):
+    return x * x
+
+
+def is_odd(x):
+    return x % 2 == 1
+
+
+def total(xs):
+    return sum(xs)
+
+
+def test_map():
+    assert list(P.map(square, range(5))) == [0, 1, 4, 9, 16]
+
+
+def test_filter():
+    assert list(P.filter(is_odd, range(8))) == [1, 3, 5, 7]
+
+
+def test_chunk():
+    assert list(P.chunk(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batch():
+    assert list(P.batch(total, range(7), 3)) == [3, 12, 6]
+
+
+def test_flatten():
+    assert list(P.flatten([[1, 2], [], [3]])) == [1, 2, 3]
+
+
+def test_zip():
+    assert list(P.zip(naturals(), "abc")) == [(0, "a"), (1, "b"), (2, "c")]
+
+
+def test_serialize_pipeline():
+    pipe = P.chunk(P.map(square, P.filter(is_odd, naturals())), 2)
+    assert next(pipe) == [1, 9]
+    ser = pickle.dumps(pipe)
+    assert next(pipe) == [25, 49]
+    assert next(pipe) == [81, 121]
+    pipe = pickle.loads(ser)
+    assert next(pipe) == [25, 49]
+    assert next(pipe) == [81, 121]
+
+
+def test_serialize_fresh_pipeline():
+    pipe = pickle.loads(pickle.dumps(P.zip(naturals(), P.map(square, naturals()))))
+    assert next(pipe) == (0, 0)
+    assert next(pipe) == (1, 1)
@@ -0,0 +1,147 @@
+import os
+import pickle
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from funbites.interface import resumable
+from funbites.registry import (
+    alias,
+    continuations,
+    lookup,
+    origins,
+    preload,
+    reference,
+    resolve,
+)
+from funbites.runtime import FunBite
+from funbites.strategy import returns
+
+
+@resumable
+def counter():
+    i = 0
+    while True:
+        yield i
+        i += 1
+
+
+def test_registered():
+    key = f"{__name__}:counter"
+    assert continuations[key] is counter.entry
+    assert reference(counter.entry) == key
+    assert lookup(key) is counter.entry
+
+
+def test_unregistered():
+    assert reference(returns) is returns
+    with pytest.raises(LookupError, match="could not be found"):
+        lookup(f"{__name__}:nonexistent")
+
+
+def test_pickle_by_key():
+    gen = counter()
+    next(gen)
+    data = pickle.dumps(gen)
+    assert b"counter__" in data
+    gen = pickle.loads(data)
+    assert next(gen) == 1
+
+
+def test_pickle_unregistered_function():
+    bite = pickle.loads(pickle.dumps(FunBite(returns, 1, continuation=returns)))
+    assert bite.func is returns
+    assert bite.args == (1,)
+    assert bite.kwargs == {"continuation": returns}
+
+
+def test_origin():
+    origin = origins[f"{__name__}:counter"]
+    assert origin.module == __name__
+    assert origin.qualname == "counter"
+    assert origin.filename == __file__
+    assert origin.lineno == counter.entry.__code__.co_firstlineno
+    # All the continuations of a function share the same origin
+    assert sum(o is origin for o in origins.values()) == len(
+        [k for k in continuations if k.startswith(f"{__name__}:counter")]
+    )
+
+
+def test_lookup_import_error(tmp_path, monkeypatch):
+    (tmp_path / "broken_mod.py").write_text("import funbites_missing_dependency\n")
+    monkeypatch.syspath_prepend(tmp_path)
+    # Errors raised while importing the module are not hidden
+    with pytest.raises(ModuleNotFoundError, match="funbites_missing_dependency"):
+        lookup("broken_mod:f__0123456789abcdef")
+    with pytest.raises(LookupError, match="could not be found"):
+        lookup("funbites_missing_package.mod:f__0123456789abcdef")
+
+
+def test_names_are_stable_across_processes(tmp_path):
+    (tmp_path / "stable_mod.py").write_text(
+        textwrap.dedent("""
+        from funbites.interface import resumable
+
+        @resumable
+        def constants():
+            x = None
+            yield b"bytes"
+            yield ...
+            yield 1.5
+        """)
+    )
+    script = (
+        "import stable_mod; from funbites.registry import continuations;"
+        "print(sorted(k for k in continuations if k.startswith('stable_mod:')))"
+    )
+    env = {k: v for k, v in os.environ.items() if k != "FUNBITES_SPLIT_CACHE"}
+    env["PYTHONPATH"] = os.pathsep.join([str(tmp_path), *sys.path])
+    names = [
+        subprocess.run(
+            [sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True
+        ).stdout
+        for _ in range(2)
+    ]
+    assert names[0] == names[1]
+    assert "stable_mod:constants__" in names[0]
+
+
+def test_preload(tmp_path, monkeypatch):
+    (tmp_path / "preloaded_mod.py").write_text(
+        textwrap.dedent("""
+        from funbites.interface import resumable
+
+        @resumable
+        def ones():
+            while True:
+                yield 1
+        """)
+    )
+    monkeypatch.syspath_prepend(tmp_path)
+    preload("preloaded_mod:ones__0123", "preloaded_mod")
+    assert "preloaded_mod" in sys.modules
+    assert "preloaded_mod:ones" in continuations
+
+
+def test_lookup_moved_module():
+    gen = counter()
+    next(gen)
+    key = reference(gen.state.func)
+    moved = key.replace(__name__, "some.old.location")
+    assert lookup(moved) is gen.state.func
+    # Entry points are not matched by name, since their name carries no hash
+    with pytest.raises(LookupError, match="could not be found"):
+        lookup("some.old.location:counter")
+
+
+def test_alias(monkeypatch):
+    monkeypatch.setattr("funbites.registry.aliases", {})
+    gen = counter()
+    next(gen)
+    key = reference(gen.state.func)
+    alias(f"{__name__}:counter__old", key)
+    func, args = resolve(f"{__name__}:counter__old", (1, 2))
+    assert func is gen.state.func
+    assert args == (1, 2)
@@ -0,0 +1,77 @@
+import pickle
+
+from funbites.checkpoint import Checkpointer, checkpoint
+from funbites.interface import checkpointable
+from funbites.runtime import FunBite
+from funbites.scheduler import Scheduler, resume_all
+from funbites.strategy import returns
+
+_log = []
+
+
+@checkpointable
+def counting(name, n):
+    total = 0
+    for i in range(n):
+        _log.append(name)
+        total += i
+        checkpoint()
+    return total
+
+
+def test_scheduler_round_robin():
+    _log.clear()
+    sched = Scheduler(quantum=2)
+    sched.submit("a", counting("a", 3, continuation=returns))
+    sched.submit("b", counting("b", 3, continuation=returns))
+    assert sched.run() == {"a": 3, "b": 3}
+    assert _log[:4] == ["a", "b", "a", "b"]
+
+
+def test_scheduler_errors():
+    sched = Scheduler()
+    sched.submit("a", counting("a", 3, continuation=returns))
+    sched.submit("b", FunBite(int, "x"))
+    assert sched.run() == {"a": 3}
+    assert isinstance(sched.errors["b"], ValueError)
+
+
+def test_resume_all(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"task{i}.pkl"
+        with path.open("wb") as f:
+            pickle.dump(counting(f"t{i}", 10 * i, continuation=returns), f)
+    (tmp_path / "broken.pkl").write_bytes(b"not a pickle")
+
+    results, errors = resume_all(tmp_path, "*.pkl", max_workers=2, cleanup=True)
+    assert {p.name: r for p, r in results.items()} == {
+        f"task{i}.pkl": sum(range(10 * i)) for i in range(5)
+    }
+    assert list(errors) == [tmp_path / "broken.pkl"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["broken.pkl"]
+
+
+def test_resume_all_saves_checkpoints(tmp_path):
+    path = tmp_path / "task.pkl"
+    with path.open("wb") as f:
+        pickle.dump(counting("t", 5, continuation=returns), f)
+    results, _ = resume_all(tmp_path)
+    assert results == {path: 10}
+    # Without cleanup, the final result is saved to the file
+    assert Checkpointer(path).run(counting, "t", 100) == 10
+
+
+def test_resume_all_checkpointer_files(tmp_path):
+    for i in range(3):
+        chk = Checkpointer(tmp_path / f"task{i}.pkl")
+        chk.store(counting(f"t{i}", i + 2, continuation=returns))
+    # A temporary file left by an interrupted write
+    (tmp_path / ".task0.pkl.tmp").write_bytes(b"partial")
+    assert (tmp_path / "task0.pkl.manifest").exists()
+
+    results, errors = resume_all(tmp_path, cleanup=True)
+    assert errors == {}
+    assert {p.name: r for p, r in results.items()} == {
+        f"task{i}.pkl": sum(range(i + 2)) for i in range(3)
+    }
+    assert [p.name for p in tmp_path.iterdir()] == [".task0.pkl.tmp"]
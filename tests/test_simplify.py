@@ -4,7 +4,7 @@ import textwrap
 
 from funbites.checkpoint import checkpoint
 from funbites.debug import as_source, show
-from funbites.simplify import GuaranteeReturn, Simplify, TagIgnores
+from funbites.simplify import simplify
 from funbites.split import SplitState
 from funbites.strategy import MainStrategy
 
@@ -35,10 +35,7 @@ def simptest(fn):
             globals=fn.__globals__,
             locals={},
         )
-        TagIgnores.run(tree, context=context)
-        Simplify.run(tree, context=context)
-        GuaranteeReturn.run(tree, context=context)
-        TagIgnores.run(tree, context=context)
+        simplify(tree, context=context)
         new_source = as_source(tree)
         show(tree)
         file_regression.check(new_source)
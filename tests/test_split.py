@@ -1,9 +1,12 @@
 from dataclasses import dataclass
+from itertools import islice
 
 import pytest
 
 from funbites.interface import checkpointable, resumable
-from funbites.strategy import MainStrategy, continuator
+from funbites.registry import continuations, origins, reference
+from funbites.runtime import FunBite
+from funbites.strategy import LoopStrategy, MainStrategy, continuator, returns
 
 strategy = MainStrategy()
 
@@ -119,6 +122,15 @@ def test_splitter_continue_and_break():
 _feedback = {}
 
 
+def _code_objects(fun):
+    origin = origins[reference(fun.entry)]
+    return [
+        v.__code__
+        for k, v in continuations.items()
+        if origins.get(k) is origin and v is not fun.entry
+    ]
+
+
 def test_splitter_exceptions():
     @checkpointable
     def f(n, d):
@@ -150,6 +162,180 @@ def test_splitter_exceptions():
     assert _feedback["finally"]
 
 
+def test_splitter_exceptions_else():
+    @checkpointable
+    def f(n, d):
+        res = 0
+        try:
+            checkpoint()
+            q = n / d
+            checkpoint()
+            res = q
+        except ZeroDivisionError:
+            _feedback["except"] = True
+            res = -1
+        else:
+            _feedback["else"] = True
+            res = res * 10
+        finally:
+            _feedback["finally"] = True
+        checkpoint()
+        return res
+
+    _feedback.clear()
+    assert f(4, 2) == 20
+    assert _feedback == {"else": True, "finally": True}
+
+    _feedback.clear()
+    assert f(4, 0) == -1
+    assert _feedback == {"except": True, "finally": True}
+
+
+def test_splitter_finally_runs_once():
+    log = []
+
+    @checkpointable
+    def f(n, d):
+        try:
+            checkpoint()
+            q = n / d
+            checkpoint()
+            if q > 10:
+                return q
+        except ZeroDivisionError:
+            log.append("except")
+            checkpoint()
+            if n < 0:
+                raise ValueError(n)
+        else:
+            log.append("else")
+        finally:
+            log.append("finally")
+        return 0
+
+    assert f(4, 2) == 0
+    assert log == ["else", "finally"]
+    log.clear()
+    assert f(40, 2) == 20
+    assert log == ["finally"]
+    log.clear()
+    assert f(4, 0) == 0
+    assert log == ["except", "finally"]
+    log.clear()
+    with pytest.raises(ValueError):
+        f(-4, 0)
+    assert log == ["except", "finally"]
+
+
+def test_splitter_finally_jumps():
+    log = []
+
+    @checkpointable
+    def f(n):
+        for i in range(n):
+            try:
+                checkpoint()
+                if i == 1:
+                    continue
+                if i == 3:
+                    break
+                log.append(i)
+            finally:
+                log.append("finally")
+        return n
+
+    assert f(5) == 5
+    assert log == [0, "finally", "finally", 2, "finally", "finally"]
+
+
+def test_splitter_split_in_finally():
+    log = []
+
+    @checkpointable
+    def f(n):
+        try:
+            checkpoint()
+            if n == 1:
+                raise ValueError(n)
+            if n == 2:
+                return n
+        finally:
+            log.append(checkpoint(n))
+        return 0
+
+    assert f(2) == 2
+    assert f(3) == 0
+    with pytest.raises(ValueError):
+        f(1)
+    assert log == [2, 3, 1]
+
+
+def test_generator_finally_runs_once():
+    log = []
+
+    @resumable
+    def gen():
+        try:
+            yield 1
+            yield 2
+        finally:
+            log.append("finally")
+
+    assert list(gen()) == [1, 2]
+    assert log == ["finally"]
+
+
+def test_splitter_exceptions_shared_handlers():
+    @checkpointable
+    def shared_handlers(n):
+        try:
+            checkpoint()
+            n = n - 1
+            checkpoint()
+            n = n - 1
+            checkpoint()
+            n = 1 / n
+        except ZeroDivisionError:
+            return -1
+        return n
+
+    assert shared_handlers(4) == 0.5
+    assert shared_handlers(2) == -1
+    # The handler is hoisted into a single helper rather than copied in every continuation
+    codes = _code_objects(shared_handlers)
+    assert sum("ZeroDivisionError" in co.co_names for co in codes) == 1
+
+
+class _Manager:
+    def __enter__(self):
+        _feedback["enter"] = True
+        return self
+
+    def __exit__(self, typ, value, tb):
+        _feedback["exit"] = typ
+        return False
+
+
+def test_splitter_with():
+    @checkpointable
+    def f(x):
+        with _Manager():
+            checkpoint()
+            if x < 0:
+                raise ValueError(x)
+            checkpoint()
+        return x
+
+    _feedback.clear()
+    assert f(3) == 3
+    assert _feedback == {"enter": True, "exit": None}
+
+    _feedback.clear()
+    with pytest.raises(ValueError):
+        f(-3)
+    assert _feedback == {"enter": True, "exit": ValueError}
+
+
 def test_splitter_nested_exceptions():
     with pytest.raises(Exception, match="not allowed to nest try/except"):
 
@@ -183,6 +369,122 @@ def test_splitter_generator():
         assert i * i == x
 
 
+def test_generator_send():
+    @resumable
+    def accumulate(total):
+        while True:
+            x = yield total
+            if x is None:
+                return total
+            total += x
+
+    gen = accumulate(10)
+    assert next(gen) == 10
+    assert gen.send(1) == 11
+    assert gen.send(5) == 16
+    with pytest.raises(StopIteration) as exc:
+        gen.send(None)
+    assert exc.value.value == 16
+
+    gen = accumulate(10)
+    with pytest.raises(TypeError, match="just-started"):
+        gen.send(1)
+
+
+def test_generator_throw():
+    @resumable
+    def robust():
+        n = 0
+        while True:
+            try:
+                yield n
+            except ValueError:
+                n = -1
+            n += 1
+
+    gen = robust()
+    assert next(gen) == 0
+    assert next(gen) == 1
+    assert gen.throw(ValueError) == 0
+    assert next(gen) == 1
+    with pytest.raises(KeyError):
+        gen.throw(KeyError("x"))
+    with pytest.raises(StopIteration):
+        next(gen)
+
+
+def test_generator_close():
+    @resumable
+    def closing():
+        try:
+            yield 1
+            yield 2
+        finally:
+            _feedback["closed"] = True
+
+    _feedback.clear()
+    gen = closing()
+    assert next(gen) == 1
+    assert "closed" not in _feedback
+    gen.close()
+    assert _feedback == {"closed": True}
+    with pytest.raises(StopIteration):
+        next(gen)
+
+    @resumable
+    def stubborn():
+        while True:
+            try:
+                yield 1
+            except GeneratorExit:
+                pass
+
+    gen = stubborn()
+    next(gen)
+    with pytest.raises(RuntimeError, match="ignored GeneratorExit"):
+        gen.close()
+
+
+def test_generator_buffered():
+    @resumable(buffer=4)
+    def countdown(n):
+        while n > 0:
+            _feedback["produced"] = n
+            yield n
+            n -= 1
+        raise ValueError("done")
+
+    _feedback.clear()
+    gen = countdown(6)
+    assert next(gen) == 6
+    # The generator ran ahead to fill the buffer
+    assert _feedback["produced"] == 3
+    assert list(islice(gen, 5)) == [5, 4, 3, 2, 1]
+    with pytest.raises(ValueError, match="done"):
+        next(gen)
+    with pytest.raises(StopIteration):
+        next(gen)
+
+    with pytest.raises(TypeError, match="buffered"):
+        countdown(6).send(1)
+
+
+def test_generator_buffered_stops_at_continuators():
+    @resumable(buffer=10)
+    def checkpointed():
+        i = 0
+        while True:
+            yield i
+            i += 1
+            if i % 3 == 0:
+                checkpoint()
+
+    gen = checkpointed()
+    assert next(gen) == 0
+    assert len(gen.buffer) == 2
+    assert list(islice(gen, 5)) == [1, 2, 3, 4, 5]
+
+
 @continuator
 def mult_result(x, *, continuation):
     val = continuation.execute(x)
@@ -254,3 +556,277 @@ def cursed(cell):
 
 def test_cursed():
     assert cursed([39]) == 0
+
+
+def _count_bites(state):
+    bites = 0
+    while isinstance(state, FunBite):
+        state = state.step()
+        bites += 1
+    return state, bites
+
+
+def test_loop_strategy():
+    @checkpointable(strategy=LoopStrategy())
+    def f(xs):
+        total = 0
+        for x in xs:
+            total += x
+        return total
+
+    assert f([1, 2, 3]) == 6
+    result, bites = _count_bites(f(list(range(50)), continuation=returns))
+    assert result == sum(range(50))
+    assert bites >= 50
+
+
+def test_loop_strategy_every():
+    @checkpointable(strategy=LoopStrategy(every=10))
+    def f(n, stop):
+        total = 0
+        for i in range(n):
+            if i == stop:
+                break
+            if i % 2:
+                continue
+            total += i
+        else:
+            total = -total
+        return total
+
+    result, bites = _count_bites(f(100, 1000, continuation=returns))
+    assert result == -sum(range(0, 100, 2))
+    assert 10 <= bites <= 15
+    assert f(100, 51) == sum(range(0, 51, 2))
+    assert f(100, 50) == sum(range(0, 50, 2))
+    assert f(0, 0) == 0
+
+
+def test_loop_strategy_every_invalid():
+    for every in (0, -1):
+        with pytest.raises(ValueError, match="at least 1"):
+            LoopStrategy(every=every)
+
+
+def test_loop_strategy_while():
+    @checkpointable(strategy=LoopStrategy(every=3))
+    def f(n):
+        total = 0
+        while n:
+            total += n
+            n -= 1
+        return total
+
+    assert f(10) == 55
+    result, bites = _count_bites(f(10, continuation=returns))
+    assert result == 55
+    assert bites >= 4
+
+
+def test_loop_strategy_nested_function():
+    @checkpointable(strategy=LoopStrategy())
+    def f(xs):
+        def g(ys):
+            return [y for y in ys if y]
+
+        for x in xs:
+            pass
+        return g(xs)
+
+    assert f([0, 1, 2]) == [1, 2]
+
+
+def test_loop_strategy_inner_loop():
+    @checkpointable(strategy=LoopStrategy(every=5))
+    def f(rows):
+        total = 0
+        for row in rows:
+            checkpoint()
+            for x in row:
+                total += x
+        return total
+
+    rows = [list(range(20))] * 3
+    result, bites = _count_bites(f(rows, continuation=returns))
+    assert result == 3 * sum(range(20))
+    assert bites >= 3 * 4
+
+
+def test_nested_return_goes_through_continuation():
+    @checkpointable
+    def f(xs):
+        checkpoint()
+        for x in xs:
+            if x > 5:
+                return x
+        return -1
+
+    assert f([1, 7]) == 7
+    assert f([7], continuation=lambda v: ("cont", v)).execute() == ("cont", 7)
+    assert f([1], continuation=lambda v: ("cont", v)).execute() == ("cont", -1)
+
+
+def test_atomic_loops():
+    def f(rows):
+        total = 0
+        for row in rows:
+            checkpoint()
+            for x in row:
+                if x % 2:
+                    continue
+                if x > 10:
+                    break
+                total += x
+        return total
+
+    split = checkpointable(f)
+    atomic = checkpointable(atomic=True)(f)
+    rows = [list(range(20))] * 3
+    assert split(rows) == atomic(rows) == 3 * sum(range(0, 11, 2))
+    _, bites = _count_bites(split(rows, continuation=returns))
+    _, atomic_bites = _count_bites(atomic(rows, continuation=returns))
+    assert atomic_bites * 3 < bites
+
+
+def test_atomic_loops_with_split_points():
+    @checkpointable(atomic=True)
+    def f(xs):
+        total = 0
+        for x in xs:
+            if x < 0:
+                break
+            checkpoint()
+            total += x
+        return total
+
+    assert f([1, 2, -1, 3]) == 3
+
+
+@checkpointable
+def tail_sum(n, acc):
+    if n == 0:
+        return acc
+    return tail_sum(n - 1, acc + n)
+
+
+@checkpointable
+def depth(n):
+    if n == 0:
+        return 0
+    return depth(n - 1) + 1
+
+
+@checkpointable
+def is_even(n):
+    if n == 0:
+        return True
+    return is_odd(n - 1)
+
+
+@checkpointable
+def is_odd(n):
+    if n == 0:
+        return False
+    return is_even(n - 1)
+
+
+def test_tail_recursion():
+    assert tail_sum(100_000, 0) == sum(range(100_001))
+    # The tail calls pass their own continuation along, so the chain does not grow
+    state = tail_sum(10, 0, continuation=returns)
+    while isinstance(state, FunBite):
+        assert state.kwargs.get("continuation", returns) is returns
+        state = state.step()
+    assert state == 55
+
+
+def test_deep_recursion():
+    assert depth(100_000) == 100_000
+
+
+def test_mutual_tail_recursion():
+    assert is_even(100_001) is False
+
+
+def test_local_recursion():
+    @checkpointable
+    def fact(n):
+        if n <= 1:
+            return 1
+        return n * fact(n - 1)
+
+    assert fact(5) == 120
+    assert fact(3000).bit_length() > 30000
+
+
+def test_generator_recursion():
+    @resumable
+    def countdown(n):
+        if n < 0:
+            return
+        sub = countdown(n - 1)
+        yield n
+        for x in sub:
+            yield x
+
+    assert list(countdown(3)) == [3, 2, 1, 0]
+
+
+def test_no_tail_call_in_try():
+    @checkpointable
+    def f(n):
+        try:
+            return depth(n)
+        except RecursionError:
+            return -1
+
+    assert f(10) == 10
+
+
+def test_closure():
+    def outer(k):
+        hits = 0
+
+        @checkpointable
+        def inner(n):
+            nonlocal hits
+            total = 0
+            for i in range(n):
+                total += i * k
+                hits += 1
+                checkpoint()
+            return total
+
+        return inner(4), hits
+
+    assert outer(2) == (12, 4)
+    assert outer(3) == (18, 4)
+    assert not [name for name in globals() if name.startswith("inner__")]
+
+
+hits = 0
+
+
+def test_global_declaration():
+    @checkpointable
+    def f(n):
+        global hits
+        for i in range(n):
+            checkpoint()
+            hits += 1
+        return hits
+
+    assert f(3) == 3
+    assert hits == 3
+
+
+def test_closure_continuator():
+    @continuator
+    def twice(x, *, continuation):
+        return continuation(x * 2)
+
+    @checkpointable
+    def f(n):
+        return twice(n) + 1
+
+    assert f(5) == 11
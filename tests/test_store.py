@@ -0,0 +1,111 @@
+import pickle
+from io import BytesIO
+
+from funbites.checkpoint import Checkpointer, checkpoint
+from funbites.interface import checkpointable
+from funbites.runtime import FunBite
+from funbites.store import ObjectStore
+from funbites.strategy import returns
+
+
+@checkpointable
+def lookup_all(table, keys):
+    found = []
+    for k in keys:
+        found.append(table[k])
+        checkpoint()
+    return sum(found)
+
+
+def _first(xs, y):
+    return xs[0] + y
+
+
+def test_store_roundtrip(tmp_path):
+    store = ObjectStore(tmp_path, min_size=10)
+    big = list(range(100))
+    buf = BytesIO()
+    keys = store.dump(FunBite(_first, big, 1), buf)
+    assert len(keys) == 1
+    assert len(buf.getvalue()) < len(pickle.dumps(big))
+    state, loaded_keys = store.load(BytesIO(buf.getvalue()))
+    assert loaded_keys == keys
+    assert state.args == (big, 1)
+    assert state.execute() == 1
+
+
+def test_store_refcounts(tmp_path):
+    store = ObjectStore(tmp_path, min_size=10)
+    keys1 = store.dump(FunBite(_first, [1] * 100, 1), BytesIO())
+    keys2 = store.dump(FunBite(_first, [1] * 100, 2), BytesIO())
+    assert keys1 == keys2
+    store.retain(keys1)
+    store.retain(keys2)
+    store.release(keys1)
+    assert len(list(tmp_path.iterdir())) == 1
+    store.release(keys2)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_store_readonly(tmp_path):
+    store = ObjectStore(tmp_path, min_size=10)
+    table = dict.fromkeys(range(100), 0)
+    store.readonly(table)
+    key, data = store._key(table, {})
+    assert data is not None
+    # The same object is not serialized again
+    assert store._key(table, {}) == (key, None)
+    # Other mutable objects are
+    other = [0] * 100
+    assert store._key(other, {})[1] is not None
+    assert store._key(other, {})[1] is not None
+
+
+def test_store_string_cache(tmp_path):
+    store = ObjectStore(tmp_path, min_size=100)
+    for i in range(1000):
+        store.dump(FunBite(_first, [i], str(i)), BytesIO())
+    # Small strings are not cached
+    assert store.strings == {}
+    text = "x" * 1000
+    for i in range(10):
+        store.dump(FunBite(_first, [0], text + str(i)), BytesIO())
+        store.dump(FunBite(_first, [0], text), BytesIO())
+        store.dump(FunBite(_first, [0], text), BytesIO())
+    # Only the strings of the latest checkpoint are kept
+    assert [value for value, _ in store.strings.values()] == [text]
+    assert store._key(text, {}) == (store.strings[id(text)][1], None)
+
+
+def test_checkpoint_dedup(tmp_path):
+    table = {k: k * 1000 for k in range(2000)}
+    path = tmp_path / "data.pkl"
+    chk = Checkpointer(path, dedup=True, measure=True)
+    chk.readonly(table)
+    assert chk.run(lookup_all, table, [1, 2]) == 3000
+    chk = Checkpointer(path, dedup=True, measure=True)
+    chk.readonly(table)
+    with chk:
+        lookup_all(table, [3, 4, 5], continuation=returns).execute()
+    objects = list((tmp_path / "data.pkl.objects").iterdir())
+    # The table is stored once; the checkpoints only refer to it
+    assert len(objects) == 1
+    assert all(r.size < len(pickle.dumps(table)) / 10 for r in chk.records)
+
+
+def test_checkpoint_dedup_restore(tmp_path):
+    table = {k: k * 1000 for k in range(2000)}
+    path = tmp_path / "data.pkl"
+    chk = Checkpointer(path, dedup=True)
+    with chk:
+        state = lookup_all(table, [3, 4], continuation=returns)
+        chk.store(state)
+    # An orphaned object, e.g. from a crash, is collected on restore
+    (tmp_path / "data.pkl.objects" / "orphan").write_bytes(b"")
+    chk = Checkpointer(path, dedup=True)
+    state = chk.restore()
+    assert state.execute() == 7000
+    assert len(list((tmp_path / "data.pkl.objects").iterdir())) == 1
+    chk.finish(10)
+    assert chk.restore().execute() == 10
+    assert list((tmp_path / "data.pkl.objects").iterdir()) == []
@@ -117,3 +117,20 @@ def test_varanal_global():
         globals={"x"},
         uses_free={"x"},
     )
+
+
+def test_varanal_except():
+    code = textwrap.dedent("""
+    try:
+        a = 1
+    except ValueError as e:
+        b = e
+    """)
+    tree = ast.parse(code)
+    results = VariableAnalysis.run(tree, context=Variables())
+
+    assert results == Variables(
+        local_defs={"a", "b", "e"},
+        uses_local={"a", "b", "e"},
+        uses_free={"ValueError"},
+    )